@@ -1,8 +1,11 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g
 import sqlite3
 import os
-from functools import wraps
-from datetime import datetime
+import re
+import threading
+from datetime import datetime, timedelta
+from contacts import normalize_email, phone_prefixes
+from search import FTS_TABLE, fts_query
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
@@ -10,11 +13,101 @@ app.secret_key = os.urandom(24)
 # Admin password from environment
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
 
-def get_db_connection():
-    conn = sqlite3.connect('data/leads.db')
+# Same SQLite file as the FastAPI backend (sqlite:///path in DATABASE_URL)
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///data/leads.db')
+DB_PATH = DATABASE_URL[len('sqlite:///'):] if DATABASE_URL.startswith('sqlite:///') else 'data/leads.db'
+PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = 200
+MAX_MATCH_COUNT = 10000
+DB_POOL_SIZE = int(os.getenv('ADMIN_DB_POOL_SIZE', '4'))  # idle connections kept between requests
+STYLES = ['pop', 'rock', 'jazz', 'classical', 'electronic', 'hip-hop', 'ambient', 'cinematic']
+STATUSES = ['new', 'contacted', 'converted']
+
+_idle_connections = []
+_pool_lock = threading.Lock()
+
+def open_db_connection():
+    """Read-only connection to the backend's database.
+
+    The backend keeps the database in WAL mode, so these reads never block its
+    writes; query_only guards against accidental writes from the dashboard.
+    """
+    # Handed between threads by the pool, but used by one request at a time
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA busy_timeout = 5000')
+    conn.execute('PRAGMA journal_mode = WAL')  # persistent; the backend sets it too
+    conn.execute('PRAGMA query_only = ON')
     return conn
 
+def get_db_connection():
+    """Connection for the current request, taken from the pool of idle ones.
+
+    The development server runs every request in a new thread, so connections
+    are pooled per process rather than per thread.
+    """
+    if 'db' not in g:
+        with _pool_lock:
+            conn = _idle_connections.pop() if _idle_connections else None
+        g.db = conn or open_db_connection()
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    with _pool_lock:
+        if len(_idle_connections) < DB_POOL_SIZE:
+            _idle_connections.append(conn)
+            return
+    conn.close()
+
+def search_filter(q):
+    """SQL condition for the search box, using the contact key indexes where possible"""
+    q = q.strip()
+    if '@' in q:
+        # Prefix range on the normalized email: ix_leads_email_normalized_created_at
+        key = normalize_email(q)
+        return 'email_normalized >= ? AND email_normalized < ?', [key, key + '\uffff']
+    prefixes = phone_prefixes(q)
+    if prefixes and re.fullmatch(r'[\d\s()+-]+', q):
+        # One prefix range per form of the number ("916 123" and "7916 123")
+        conditions = ' OR '.join(['phone_normalized >= ? AND phone_normalized < ?'] * len(prefixes))
+        return f'({conditions})', [value for prefix in prefixes for value in (prefix, prefix + '\uffff')]
+    # Anything else goes through the backend's full-text index (search.py)
+    match = fts_query(q)
+    if match is None:
+        return '0', []
+    return f'id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)', [match]
+
+def lead_filters(args):
+    """WHERE clause and parameters for the dashboard's filter form"""
+    conditions, params = [], []
+    for column, allowed in (('status', STATUSES), ('style', STYLES)):
+        value = args.get(column)
+        if value in allowed:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if args.get('source'):
+        conditions.append('source = ?')
+        params.append(args['source'])
+    for key, condition, shift in (('date_from', 'created_at >= ?', 0), ('date_to', 'created_at < ?', 1)):
+        if not args.get(key):
+            continue
+        try:
+            day = datetime.strptime(args[key], '%Y-%m-%d') + timedelta(days=shift)
+        except ValueError:
+            flash('Дата должна быть в формате ГГГГ-ММ-ДД', 'error')
+            continue
+        conditions.append(condition)
+        params.append(day.strftime('%Y-%m-%d'))
+    if args.get('q', '').strip():
+        condition, values = search_filter(args['q'])
+        conditions.append(condition)
+        params.extend(values)
+    return conditions, params
+
 @app.route('/admin', methods=['GET', 'POST'])
 def admin():
     if request.method == 'POST':
@@ -24,43 +117,78 @@ def admin():
             flash('Вы успешно вошли в систему!', 'success')
         else:
             flash('Неверный пароль!', 'error')
-    
+
     if request.args.get('logout'):
         session.pop('admin_logged_in', None)
         flash('Вы вышли из системы!', 'info')
         return redirect(url_for('admin'))
-    
+
     if 'admin_logged_in' not in session:
         return render_template('admin/login.html')
-    
-    # Показываем дашборд если авторизованы
+
+    # Показываем дашборд если авторизованы: одна страница заявок, новые сверху
     conn = get_db_connection()
-    leads = conn.execute('SELECT * FROM leads ORDER BY created_at DESC').fetchall()
-    conn.close()
-    
-    # Statistics
-    total_leads = len(leads)
-    today_leads = len([lead for lead in leads if 
-                      datetime.strptime(lead['created_at'], '%Y-%m-%d %H:%M:%S').date() == datetime.now().date()])
-    
-    return render_template('admin/dashboard.html', 
-                         leads=leads, 
+    conditions, params = lead_filters(request.args)
+    page_size = min(max(request.args.get('per_page', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    page_conditions, page_params = list(conditions), list(params)
+    before = request.args.get('before', '')
+    if '|' in before:
+        # Keyset pagination on (created_at, id): every page is an index range scan
+        before_created_at, before_id = before.rsplit('|', 1)
+        page_conditions.append('(created_at < ? OR (created_at = ? AND id < ?))')
+        page_params.extend([before_created_at, before_created_at, int(before_id) if before_id.isdigit() else 0])
+
+    where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ''
+    leads = conn.execute(
+        f'SELECT id, name, email, phone, style, status, source, created_at FROM leads {where} '
+        'ORDER BY created_at DESC, id DESC LIMIT ?',
+        page_params + [page_size + 1]
+    ).fetchall()
+    next_before = None
+    if len(leads) > page_size:
+        leads = leads[:page_size]
+        next_before = f"{leads[-1]['created_at']}|{leads[-1]['id']}"
+
+    # Statistics from the daily rollup maintained by the backend (UTC days, like /api/stats)
+    today = datetime.utcnow().date().isoformat()
+    total_leads = conn.execute('SELECT COALESCE(SUM(count), 0) FROM lead_daily_stats').fetchone()[0]
+    today_leads = conn.execute('SELECT COALESCE(SUM(count), 0) FROM lead_daily_stats WHERE day = ?', (today,)).fetchone()[0]
+    if conditions:
+        # Counting stops at MAX_MATCH_COUNT: an exact figure for a broad filter costs a full scan
+        matched_leads = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM leads WHERE {' AND '.join(conditions)} LIMIT ?)",
+            params + [MAX_MATCH_COUNT + 1]
+        ).fetchone()[0]
+    else:
+        matched_leads = total_leads
+
+    filters = {key: request.args.get(key, '') for key in ('q', 'status', 'style', 'source', 'date_from', 'date_to')}
+    return render_template('admin/dashboard.html',
+                         leads=leads,
                          total_leads=total_leads,
-                         today_leads=today_leads)
+                         today_leads=today_leads,
+                         matched_leads=matched_leads,
+                         max_match_count=MAX_MATCH_COUNT,
+                         filters=filters,
+                         styles=STYLES,
+                         statuses=STATUSES,
+                         per_page=page_size,
+                         is_first_page=not before,
+                         next_before=next_before)
 
 @app.route('/admin/lead/<int:lead_id>')
 def lead_details(lead_id):
     if 'admin_logged_in' not in session:
         return redirect(url_for('admin'))
-    
+
     conn = get_db_connection()
     lead = conn.execute('SELECT * FROM leads WHERE id = ?', (lead_id,)).fetchone()
-    conn.close()
-    
+
     if lead is None:
         flash('Заявка не найдена!', 'error')
         return redirect(url_for('admin'))
-    
+
     return render_template('admin/lead_details.html', lead=lead)
 
 if __name__ == '__main__':
@@ -0,0 +1,89 @@
+"""
+Load benchmark for POST /api/leads
+Runs N concurrent clients against a running backend and reports latency percentiles
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db RATE_LIMIT_EXEMPT=127.0.0.1/32 uvicorn main:app --port 8000
+    python benchmarks/bench_create_lead.py --url http://127.0.0.1:8000 --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def lead_payload(n: int) -> dict:
+    return {
+        "name": f"Bench User {n}",
+        "email": f"bench{n}@example.com",
+        "phone": f"+7999{n:07d}",
+        "style": "pop",
+        "has_text": n % 2 == 0,
+        "text_description": "bench" if n % 2 == 0 else None,
+        "message": "load test",
+        "source": "benchmark",
+    }
+
+
+async def run(url: str, concurrency: int, total: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+
+        async def worker():
+            nonlocal errors
+            for n in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/leads", json=lead_payload(n))
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": "POST /api/leads",
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.concurrency, args.requests))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
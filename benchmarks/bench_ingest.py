@@ -0,0 +1,130 @@
+"""
+Lead ingestion throughput benchmark
+Inserts leads from N concurrent producers into a throwaway SQLite database and
+reports leads/sec for per-lead commits vs. the batched writer, under the default
+rollback journal and under WAL + synchronous=NORMAL
+
+Usage:
+    python benchmarks/bench_ingest.py --db /tmp/bench_ingest.db --leads 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFIGS = [
+    ("direct", "DELETE", "FULL"),
+    ("direct", "WAL", "NORMAL"),
+    ("batch", "DELETE", "FULL"),
+    ("batch", "WAL", "NORMAL"),
+]
+
+
+def lead_values(n: int) -> dict:
+    return {
+        "name": f"Bench User {n}",
+        "email": f"bench{n}@example.com",
+        "phone": f"+7999{n:07d}",
+        "style": "pop",
+        "has_text": n % 2,
+        "text_description": None,
+        "message": "load test",
+        "source": "benchmark",
+    }
+
+
+async def run_config(app_main, db_path: str, mode: str, journal_mode: str, synchronous: str,
+                     leads: int, concurrency: int, batch_size: int, batch_delay: float) -> dict:
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    app_main.Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    url = f"sqlite+aiosqlite:///{db_path}"
+    engine = create_async_engine(url, **app_main.get_pool_options(url))
+    event.listen(engine.sync_engine, "connect", set_pragmas)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    Lead = app_main.Lead
+
+    writer = None
+    if mode == "batch":
+        writer = app_main.BatchWriter(session_factory, Lead, max_batch=batch_size, max_delay=batch_delay)
+        writer.start()
+
+    async def insert(n: int):
+        if writer is not None:
+            lead, _ = await writer.submit(**lead_values(n))
+        else:
+            async with session_factory() as db:
+                lead = Lead(**lead_values(n))
+                db.add(lead)
+                await db.commit()
+        assert lead.id is not None
+
+    counter = iter(range(leads))
+
+    async def producer():
+        for n in counter:
+            await insert(n)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "mode": mode,
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "elapsed_s": round(elapsed, 3),
+        "leads_per_s": round(leads / elapsed, 1),
+    }
+    if writer is not None:
+        result["commits"] = writer.batches
+        await writer.stop()
+    await engine.dispose()
+    return result
+
+
+async def run(args) -> dict:
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{args.db}.app")
+    import main as app_main
+
+    results = []
+    for mode, journal_mode, synchronous in CONFIGS:
+        results.append(await run_config(
+            app_main, args.db, mode, journal_mode, synchronous,
+            args.leads, args.concurrency, args.batch_size, args.batch_delay_ms / 1000,
+        ))
+    return {"leads": args.leads, "concurrency": args.concurrency, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="/tmp/bench_ingest.db")
+    parser.add_argument("--leads", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--batch-delay-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
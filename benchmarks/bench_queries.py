@@ -0,0 +1,123 @@
+"""
+Query benchmark for the lead list and stats queries
+Seeds a throwaway SQLite database with synthetic leads and times the hot queries
+with and without the secondary indexes
+
+Usage:
+    python benchmarks/bench_queries.py --db /tmp/bench_queries.db --leads 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STYLES = ["pop", "rock", "jazz", "classical", "electronic", "hip-hop", "ambient", "cinematic"]
+STATUSES = ["new", "contacted", "converted"]
+
+
+def seed(engine, lead_model, track_model, leads: int, days: int, batch: int = 50000):
+    """Bulk-insert synthetic leads spread over the last `days` days"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, leads, batch):
+            rows = []
+            for n in range(start, min(start + batch, leads)):
+                rows.append({
+                    "name": f"Lead {n}",
+                    "email": f"lead{n}@example.com",
+                    "phone": f"+7999{n:07d}",
+                    "style": rng.choice(STYLES),
+                    "has_text": n % 2,
+                    "text_description": None,
+                    "message": None,
+                    "source": "landing",
+                    "status": rng.choices(STATUSES, weights=[2, 5, 3])[0],
+                    "created_at": now - timedelta(seconds=rng.randint(0, days * 86400)),
+                    "telegram_sent": 1,
+                })
+            conn.execute(lead_model.__table__.insert(), rows)
+        conn.execute(track_model.__table__.insert(), [
+            {"lead_id": n, "prompt": "bench", "style": "pop", "status": "completed", "created_at": now}
+            for n in range(1, min(leads, 10000) + 1)
+        ])
+
+
+def timed(conn, statement, repeat: int) -> float:
+    """Best-of-N wall time of a statement in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(statement).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2)
+
+
+def run_queries(engine, main, repeat: int) -> dict:
+    from sqlalchemy import func, select
+
+    Lead = main.Lead
+    queries = {
+        "list_leads_first_page": select(Lead).order_by(Lead.created_at.desc()).limit(100),
+        "list_leads_offset_10000": select(Lead).order_by(Lead.created_at.desc()).offset(10000).limit(100),
+        "list_leads_status_new": select(Lead).where(Lead.status == "new").order_by(Lead.created_at.desc()).limit(100),
+        "count_today": select(func.count()).select_from(Lead).where(Lead.created_at >= main.utc_today_start()),
+        "count_status_new": select(func.count()).select_from(Lead).where(Lead.status == "new"),
+        "stats_single_query": main.stats_query(),
+    }
+    with engine.connect() as conn:
+        return {name: timed(conn, statement, repeat) for name, statement in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="/tmp/bench_queries.db")
+    parser.add_argument("--leads", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    import main as app_main
+    from sqlalchemy import text
+
+    engine = app_main.engine
+    app_main.run_migrations(engine)
+    started = time.perf_counter()
+    seed(engine, app_main.Lead, app_main.TrackRequest, args.leads, args.days)
+    app_main.rebuild_lead_rollups(engine)
+    seed_s = round(time.perf_counter() - started, 1)
+
+    index_names = [index.name for table in app_main.Base.metadata.sorted_tables for index in table.indexes]
+    with engine.begin() as conn:
+        for name in index_names:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+    without_indexes = run_queries(engine, app_main, args.repeat)
+
+    started = time.perf_counter()
+    app_main.run_migrations(engine)
+    migrate_s = round(time.perf_counter() - started, 1)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    with_indexes = run_queries(engine, app_main, args.repeat)
+
+    print(json.dumps({
+        "leads": args.leads,
+        "seed_s": seed_s,
+        "migration_s": migrate_s,
+        "without_indexes_ms": without_indexes,
+        "with_indexes_ms": with_indexes,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Async HTTP load generator
+Keeps `concurrency` requests in flight over shared keep-alive connections and
+summarizes throughput and latency percentiles of one scenario
+"""
+import asyncio
+import time
+from typing import Callable, Collection, Dict, Tuple
+
+import httpx
+
+# n -> (method, path, httpx request kwargs)
+RequestFactory = Callable[[int], Tuple[str, str, dict]]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: RequestFactory,
+    concurrency: int,
+    total: int,
+    warmup: int = 0,
+    ok_statuses: Collection[int] = (200,),
+) -> dict:
+    """Send `warmup` untimed requests, then `total` timed ones"""
+    for n in range(warmup):
+        method, path, kwargs = make_request(-n - 1)
+        await client.request(method, path, **kwargs)
+
+    latencies = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for n in counter:
+            method, path, kwargs = make_request(n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = str(response.status_code)
+                if response.status_code not in ok_statuses:
+                    errors += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+    }
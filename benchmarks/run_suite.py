@@ -0,0 +1,257 @@
+"""
+API benchmark suite
+Seeds a throwaway database, starts the backend and a Telegram stub locally, drives the
+main endpoints with the async load generator and writes throughput and p50/p95/p99
+per scenario as JSON. With --compare it diffs against an earlier run and exits with
+code 1 on a regression
+
+Usage:
+    python benchmarks/run_suite.py --leads 1000000 --tracks 100000 --output results.json
+    python benchmarks/run_suite.py --leads 1000000 --tracks 100000 --reuse-db --compare results.json
+    python benchmarks/run_suite.py --url http://127.0.0.1:8000 --admin-token $ADMIN_API_TOKEN   # already running server
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import run_scenario  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STYLES = ["pop", "rock", "jazz", "classical", "electronic", "hip-hop", "ambient", "cinematic"]
+STATIC_PATHS = ["/", "/static/style.css", "/static/app.js"]
+RUN_ID = f"{int(time.time())}"
+
+
+def create_lead(n: int):
+    return "POST", "/api/leads", {"json": {
+        "name": f"Bench User {n}",
+        "email": f"bench{RUN_ID}.{n}@example.com",
+        "phone": f"+7{RUN_ID[-4:]}{n % 10 ** 6:06d}",
+        "style": STYLES[n % len(STYLES)],
+        "has_text": n % 2 == 0,
+        "text_description": "bench" if n % 2 == 0 else None,
+        "message": "load test",
+        "source": "benchmark",
+    }}
+
+
+def list_leads(admin_token: str):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    def make_request(n: int):
+        params = {"limit": 50}
+        if n % 3 == 1:
+            params["status"] = "new"
+        elif n % 3 == 2:
+            params["style"] = STYLES[n % len(STYLES)]
+        return "GET", "/api/leads", {"params": params, "headers": headers}
+
+    return make_request
+
+
+def get_stats(n: int):
+    return "GET", "/api/stats", {}
+
+
+def generate_track(n: int):
+    return "POST", "/api/generate", {"json": {"prompt": f"bench track {n}", "style": STYLES[n % len(STYLES)], "duration": 30}}
+
+
+def static(n: int):
+    encoding = ("br", "gzip", "identity")[n % 3]
+    return "GET", STATIC_PATHS[n % len(STATIC_PATHS)], {"headers": {"Accept-Encoding": encoding}}
+
+
+def scenarios(admin_token: str) -> dict:
+    return {
+        "create_lead": create_lead,
+        "list_leads": list_leads(admin_token),
+        "get_stats": get_stats,
+        "generate_track": generate_track,
+        "static": static,
+    }
+
+
+def start_process(args, log_path: str, env: dict) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=ROOT, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def stop_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_all(url: str, names, admin_token: str, concurrency: int, total: int, warmup: int) -> dict:
+    factories = scenarios(admin_token)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        for name in names:
+            results[name] = await run_scenario(client, factories[name], concurrency, total, warmup)
+            print(f"{name:15} {results[name]['throughput_rps']:>9} rps  p50 {results[name]['p50_ms']:>8} ms  "
+                  f"p95 {results[name]['p95_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms  errors {results[name]['errors']}",
+                  file=sys.stderr)
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose throughput dropped or p95 grew by more than `tolerance`, or that started failing"""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        rps_change = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        p95_change = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        print(f"{name:15} rps {rps_change:+7.1%}  p95 {p95_change:+7.1%}", file=sys.stderr)
+        if rps_change < -tolerance or p95_change > tolerance or (result["errors"] and not before["errors"]):
+            regressions.append({"scenario": name, "rps_change": round(rps_change, 3), "p95_change": round(p95_change, 3),
+                                "errors": result["errors"]})
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--db", default="/tmp/bench_suite.db")
+    parser.add_argument("--leads", type=int, default=10000)
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding when --db exists")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--telegram-port", type=int, default=8091)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the backend")
+    parser.add_argument("--admin-token", default="bench-admin-token")
+    parser.add_argument("--scenarios", default="create_lead,list_leads,get_stats,generate_track,static")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests per scenario")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before it counts as a regression")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(scenarios(args.admin_token))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    seeding = None
+    processes = []
+    url = args.url
+    try:
+        if url is None:
+            if not (args.reuse_db and os.path.exists(args.db)):
+                from seed import seed
+
+                print(f"Seeding {args.leads} leads and {args.tracks} tracks into {args.db}", file=sys.stderr)
+                seeding = seed(args.db, args.leads, args.tracks)
+                # importing main configured INFO logging: keep httpx from logging every request
+                logging.getLogger("httpx").setLevel(logging.WARNING)
+            telegram_url = f"http://127.0.0.1:{args.telegram_port}"
+            processes.append(start_process(
+                [sys.executable, "benchmarks/stub_telegram.py", "--port", str(args.telegram_port)],
+                "/tmp/bench_suite_telegram.log", {}
+            ))
+            processes.append(start_process(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                "/tmp/bench_suite_backend.log",
+                {
+                    "DATABASE_URL": f"sqlite:///{args.db}",
+                    "APP_DIR": os.path.join(ROOT, "templates"),
+                    "AUTO_MIGRATE": "false",
+                    "TELEGRAM_API_BASE": telegram_url,
+                    "TELEGRAM_BOT_TOKEN": "bench",
+                    "TELEGRAM_ADMIN_ID": "1",
+                    "ADMIN_API_TOKEN": args.admin_token,
+                    "RATE_LIMIT_ENABLED": "false",
+                    "GENERATION_BACKEND": "fake",
+                    # Measure the enqueue path only: a generation worker would compete for the CPU
+                    "TRACK_WORKER_MODE": "external",
+                },
+            ))
+            url = f"http://127.0.0.1:{args.port}"
+            wait_until_ready(f"{telegram_url}/_messages")
+            wait_until_ready(f"{url}/readyz")
+
+        results = asyncio.run(run_all(url, names, args.admin_token, args.concurrency, args.requests, args.warmup))
+        telegram = None
+        if processes:
+            time.sleep(2)  # let the dispatcher flush its last digest
+            telegram = httpx.get(f"http://127.0.0.1:{args.telegram_port}/_messages").json()
+            telegram = {"requests": telegram["requests"], "messages": len(telegram["messages"])}
+    finally:
+        for process in reversed(processes):
+            stop_process(process)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "url": args.url or "local",
+            "workers": args.workers,
+            "leads": args.leads,
+            "tracks": args.tracks,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed": seeding,
+            "telegram": telegram,
+        },
+        "results": results,
+    }
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        report["baseline"] = {"file": args.compare, "git_revision": baseline.get("meta", {}).get("git_revision")}
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Synthetic data for benchmarks
+Creates a SQLite database with the app's schema and fills `leads` and `track_requests`
+with reproducible rows (10k to 10M), spread over the last `--days` days
+
+Usage:
+    python benchmarks/seed.py --db /tmp/bench_suite.db --leads 1000000 --tracks 100000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STYLES = ["pop", "rock", "jazz", "classical", "electronic", "hip-hop", "ambient", "cinematic"]
+LEAD_STATUSES = ["new", "contacted", "converted"]
+TRACK_STATUSES = ["completed", "failed", "pending"]
+
+LEAD_COLUMNS = (
+    "name", "email", "phone", "style", "has_text", "text_description", "message", "source",
+    "status", "created_at", "telegram_sent", "email_normalized", "phone_normalized",
+)
+TRACK_COLUMNS = ("lead_id", "prompt", "style", "status", "audio_url", "created_at", "duration", "attempts", "updated_at", "token")
+
+
+def timestamp(value: datetime) -> str:
+    """DateTime as SQLAlchemy stores it in SQLite"""
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+
+def lead_rows(start: int, stop: int, now: datetime, days: int, rng: random.Random):
+    for n in range(start, stop):
+        has_text = n % 2
+        yield (
+            f"Lead {n}",
+            f"lead{n}@example.com",
+            f"+7999{n:07d}",
+            rng.choice(STYLES),
+            has_text,
+            "Про лето и море" if has_text else None,
+            "Хочу трек на день рождения" if n % 5 == 0 else None,
+            "landing",
+            rng.choices(LEAD_STATUSES, weights=[2, 5, 3])[0],
+            timestamp(now - timedelta(seconds=rng.randint(0, days * 86400))),
+            1,
+            f"lead{n}@example.com",
+            f"7999{n:07d}",
+        )
+
+
+def track_rows(start: int, stop: int, leads: int, now: datetime, days: int, rng: random.Random):
+    for n in range(start, stop):
+        status = rng.choices(TRACK_STATUSES, weights=[90, 5, 5])[0]
+        created_at = timestamp(now - timedelta(seconds=rng.randint(0, days * 86400)))
+        token = f"{rng.getrandbits(128):032x}"
+        yield (
+            rng.randint(1, leads) if leads else None,
+            f"Benchmark prompt {n}",
+            rng.choice(STYLES),
+            status,
+            f"/tracks/{token}/audio.mp3" if status == "completed" else None,
+            created_at,
+            30,
+            1 if status != "pending" else 0,
+            created_at,
+            token,
+        )
+
+
+def insert(conn: sqlite3.Connection, table: str, columns, rows):
+    placeholders = ", ".join("?" for _ in columns)
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def seed(db_path: str, leads: int, tracks: int, days: int = 365, batch: int = 50000, seed_value: int = 42) -> dict:
+    """Fresh database at `db_path` with the given volumes; returns timings.
+
+    Secondary indexes and the search triggers are dropped during the bulk load and
+    rebuilt by run_migrations() afterwards, which is much faster than maintaining them row by row.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import main as app_main
+    from search import drop_search_triggers
+
+    app_main.run_migrations(app_main.engine)
+    app_main.engine.dispose()
+    index_names = [index.name for table in app_main.Base.metadata.sorted_tables for index in table.indexes]
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for name in index_names:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        drop_search_triggers(conn)
+        for start in range(0, leads, batch):
+            insert(conn, "leads", LEAD_COLUMNS, lead_rows(start, min(start + batch, leads), now, days, rng))
+            conn.commit()
+        for start in range(0, tracks, batch):
+            insert(conn, "track_requests", TRACK_COLUMNS, track_rows(start, min(start + batch, tracks), leads, now, days, rng))
+            conn.commit()
+    finally:
+        conn.close()
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app_main.run_migrations(app_main.engine)
+    with app_main.engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    app_main.engine.dispose()
+    index_s = time.perf_counter() - started
+
+    return {"db": db_path, "leads": leads, "tracks": tracks, "load_s": round(load_s, 1), "index_s": round(index_s, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="/tmp/bench_suite.db")
+    parser.add_argument("--leads", type=int, default=10000)
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    print(json.dumps(seed(args.db, args.leads, args.tracks, args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
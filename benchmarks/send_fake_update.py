@@ -0,0 +1,74 @@
+"""
+Fake Telegram update sender
+POSTs bot commands to the backend's webhook the way Telegram does, with the secret
+token header, and prints the replies recorded by stub_telegram.py
+
+Usage:
+    python benchmarks/stub_telegram.py --port 8081 &
+    BOT_MODE=webhook BOT_WEBHOOK_SECRET=s3cret TELEGRAM_API_BASE=http://127.0.0.1:8081 \
+        TELEGRAM_BOT_TOKEN=test TELEGRAM_ADMIN_ID=1 uvicorn main:app &
+    python benchmarks/send_fake_update.py --secret s3cret --user-id 1 /start /today /stats
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+
+def command_update(update_id: int, user_id: int, text: str) -> dict:
+    """A private-chat message update as Telegram sends it for a typed command"""
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Admin"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("commands", nargs="+", help="message texts, e.g. /today")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/telegram/webhook")
+    parser.add_argument("--secret", default="", help="value of X-Telegram-Bot-Api-Secret-Token")
+    parser.add_argument("--user-id", type=int, default=1, help="sender, TELEGRAM_ADMIN_ID to pass the admin check")
+    parser.add_argument("--telegram", default="http://127.0.0.1:8081", help="stub_telegram.py to read the replies from")
+    parser.add_argument("--wait", type=float, default=5.0, help="seconds to wait for the replies")
+    args = parser.parse_args()
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    with httpx.Client(timeout=10.0) as client:
+        already = len(client.get(f"{args.telegram}/_messages").json()["messages"])
+        update_id = int(time.time())
+        for n, text in enumerate(args.commands):
+            started = time.perf_counter()
+            response = client.post(args.url, json=command_update(update_id + n, args.user_id, text), headers=headers)
+            print(f"{text:10} -> {response.status_code} in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+            if response.status_code != 200:
+                sys.exit(1)
+
+        # Commands that load data send a "loading" message first: stop once replies stop coming
+        deadline = time.monotonic() + args.wait
+        replies, settled_at = [], time.monotonic()
+        while time.monotonic() < deadline:
+            latest = client.get(f"{args.telegram}/_messages").json()["messages"][already:]
+            if len(latest) != len(replies):
+                replies, settled_at = latest, time.monotonic()
+            elif len(replies) >= len(args.commands) and time.monotonic() - settled_at > 0.5:
+                break
+            time.sleep(0.1)
+    for reply in replies:
+        print(f"--- {reply['method']} to {reply['chat']['id']}\n{reply['text']}\n")
+    if len(replies) < len(args.commands):
+        print(f"Only {len(replies)} of {len(args.commands)} replies arrived", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Local stand-in for the shared rate limit Redis
+Speaks just enough RESP for RedisRateLimitStore (PING, CLIENT, SCRIPT LOAD, EVAL/EVALSHA
+of the token bucket script) so several uvicorn workers can share buckets without a
+real Redis server
+
+Usage:
+    python benchmarks/stub_redis.py --port 6380
+    RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://127.0.0.1:6380/0 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import TOKEN_BUCKET_SCRIPT, take_token  # noqa: E402
+
+SCRIPT_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode()).hexdigest()
+
+buckets = {}
+stats = {"commands": 0, "rejected": 0}
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b"".join(encode(item) for item in value)
+    if value == "OK" or value == "PONG":
+        return f"+{value}\r\n".encode()
+    data = value if isinstance(value, bytes) else str(value).encode()
+    return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.decode().split()  # inline command (redis-cli / telnet)
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2].decode())
+    return args
+
+
+def token_bucket(key: str, rate: float, capacity: float, now: float, cost: float):
+    tokens, updated_at = buckets.get(key, (None, None))
+    tokens, allowed, retry_after = take_token(tokens, updated_at, now, rate, capacity, cost)
+    buckets[key] = (tokens, now)
+    if not allowed:
+        stats["rejected"] += 1
+    return [int(allowed), repr(retry_after)]
+
+
+def execute(args):
+    stats["commands"] += 1
+    name = args[0].upper()
+    if name == "PING":
+        return "PONG"
+    if name in ("CLIENT", "SELECT", "HELLO"):
+        return "OK" if name != "HELLO" else Exception("ERR unknown command 'HELLO'")
+    if name == "SCRIPT" and args[1].upper() == "LOAD":
+        if args[2] != TOKEN_BUCKET_SCRIPT:
+            return Exception("ERR stub only knows the rate limit script")
+        return SCRIPT_SHA
+    if name in ("EVAL", "EVALSHA"):
+        script = args[1]
+        if (name == "EVALSHA" and script != SCRIPT_SHA) or (name == "EVAL" and script != TOKEN_BUCKET_SCRIPT):
+            return Exception("NOSCRIPT No matching script. Please use EVAL.")
+        key = args[3]
+        rate, capacity, now, cost = (float(value) for value in args[4:8])
+        return token_bucket(key, rate, capacity, now, cost)
+    if name == "INFO":
+        return f"commands:{stats['commands']}\r\nkeys:{len(buckets)}\r\nrejected:{stats['rejected']}\r\n"
+    if name == "FLUSHALL":
+        buckets.clear()
+        return "OK"
+    return Exception(f"ERR unknown command '{args[0]}'")
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            args = await read_command(reader)
+            if not args:
+                break
+            writer.write(encode(execute(args)))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Redis stub listening on {host}:{port} (started {time.strftime('%H:%M:%S')})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
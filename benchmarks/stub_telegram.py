@@ -0,0 +1,110 @@
+"""
+Local stand-in for the Telegram Bot API
+Records sendMessage calls and can simulate 429 rate limiting and 5xx errors.
+Also answers getMe and setWebhook, enough for the bot to start (see send_fake_update.py)
+
+Usage:
+    python benchmarks/stub_telegram.py --port 8081 --rate-limit 1.0 --fail-rate 0.1
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 TELEGRAM_BOT_TOKEN=test TELEGRAM_ADMIN_ID=1 uvicorn main:app
+
+    curl http://127.0.0.1:8081/_messages    # what the backend sent
+"""
+import argparse
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Telegram Bot API stub")
+app.state.messages = []
+app.state.last_sent = {}
+app.state.rate_limit = 0.0
+app.state.fail_rate = 0.0
+app.state.requests = 0
+app.state.rejected = 0
+app.state.webhook = ""
+
+
+@app.post("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    app.state.requests += 1
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = dict(await request.form())
+
+    if method == "getMe":
+        return {"ok": True, "result": {"id": 1000, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}}
+    if method in ("setWebhook", "deleteWebhook"):
+        app.state.webhook = payload.get("url", "") if method == "setWebhook" else ""
+        return {"ok": True, "result": True}
+
+    if app.state.fail_rate and random.random() < app.state.fail_rate:
+        app.state.rejected += 1
+        return JSONResponse({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status_code=502)
+
+    chat_id = str(payload.get("chat_id", ""))
+    now = time.monotonic()
+    last = app.state.last_sent.get(chat_id)
+    if app.state.rate_limit and last is not None and now - last < app.state.rate_limit:
+        app.state.rejected += 1
+        retry_after = max(1, round(app.state.rate_limit - (now - last)))
+        return JSONResponse(
+            {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            },
+            status_code=429,
+        )
+    app.state.last_sent[chat_id] = now
+
+    message = {
+        "message_id": len(app.state.messages) + 1,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "text": payload.get("text", ""),
+        "method": method,
+        "token": token,
+    }
+    app.state.messages.append(message)
+    return {"ok": True, "result": message}
+
+
+@app.get("/_messages")
+async def messages():
+    return {
+        "requests": app.state.requests,
+        "rejected": app.state.rejected,
+        "webhook": app.state.webhook,
+        "messages": app.state.messages,
+    }
+
+
+@app.delete("/_messages")
+async def reset():
+    app.state.messages.clear()
+    app.state.last_sent.clear()
+    app.state.requests = 0
+    app.state.rejected = 0
+    return {"ok": True}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="min seconds between messages to one chat")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 502")
+    args = parser.parse_args()
+
+    app.state.rate_limit = args.rate_limit
+    app.state.fail_rate = args.fail_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,41 @@ Telegram Bot for Admin Notifications & Lead Management
 Sends notifications and provides commands to view leads
 """
 import os
+import sys
+import asyncio
+import html
 import logging
+import secrets
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 import httpx
 from datetime import datetime
+from typing import Optional
+from cache import TTLCache
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_ADMIN_ID = os.getenv("TELEGRAM_ADMIN_ID", "")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# "polling" runs this script as a long-polling process; "webhook" lets the backend
+# receive updates at BOT_WEBHOOK_PATH and makes this script only register the webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")  # public https URL of BOT_WEBHOOK_PATH
+BOT_WEBHOOK_PATH = "/telegram/webhook"
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")  # echoed by Telegram in X-Telegram-Bot-Api-Secret-Token
+# The bot only has command handlers: don't let Telegram deliver anything else
+ALLOWED_UPDATES = [Update.MESSAGE]
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+BACKEND_HEADERS = {"Authorization": f"Bearer {ADMIN_API_TOKEN}"} if ADMIN_API_TOKEN else {}
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "10"))  # seconds
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", "15"))  # seconds backend answers are reused, 0 disables
+LEADS_SHOWN = 10  # leads listed in one message
+
+# Backend answers shared by all commands: key -> result
+response_cache = TTLCache(maxsize=64, ttl=BOT_CACHE_TTL)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Welcome message"""
@@ -50,7 +73,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "❓ <b>Справка по командам</b>\n\n"
         "/start - Главное меню\n"
-        "/leads - Показать все заявки (последние 20)\n"
+        "/leads - Показать все заявки (последние 10)\n"
         "/today - Заявки за сегодня\n"
         "/stats - Общая статистика\n"
         "/status - Проверка статуса бота\n"
@@ -62,41 +85,79 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='HTML'
     )
 
-async def get_leads_from_api(today_only=False):
-    """Fetch leads from backend API"""
+class ApiReader:
+    """Reads leads and stats from the backend's admin API over one pooled
+    keep-alive client; used by the standalone bot process"""
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            headers=BACKEND_HEADERS,
+            timeout=BACKEND_TIMEOUT,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60)
+        )
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def get(self, path, params=None):
+        """(json, X-Total-Count or None); raises on connection errors and non-200 answers"""
+        response = await self.client.get(path, params=params)
+        response.raise_for_status()
+        total = response.headers.get("X-Total-Count")
+        return response.json(), int(total) if total is not None else None
+
+    async def leads(self, limit: int, date_from: Optional[datetime] = None):
+        """(newest leads as JSON dicts, number of leads matching)"""
+        params = {"limit": limit, "count": "true"}
+        if date_from is not None:
+            params["date_from"] = date_from.isoformat()
+        return await self.get("/api/leads", params)
+
+    async def stats(self) -> dict:
+        stats, _ = await self.get("/api/stats")
+        return stats
+
+async def start_reader(application: Application):
+    await application.bot_data["reader"].start()
+
+async def stop_reader(application: Application):
+    await application.bot_data["reader"].stop()
+
+async def cached(key, load):
+    """Result of `load()`, reused for BOT_CACHE_TTL seconds; errors are not cached"""
+    result = response_cache.get(key)
+    if result is None:
+        result = await load()
+        if BOT_CACHE_TTL > 0:
+            response_cache.set(key, result)
+    return result
+
+async def get_leads(reader, today_only=False):
+    """Fetch the newest leads to show and the number of matching leads"""
+    # UTC day boundary, the same one /api/stats uses for today_leads
+    date_from = datetime.combine(datetime.utcnow().date(), datetime.min.time()) if today_only else None
     try:
-        async with httpx.AsyncClient() as client:
-            if today_only:
-                # Get all and filter by date
-                response = await client.get(f"{BACKEND_URL}/api/leads?limit=100", timeout=10.0)
-                if response.status_code == 200:
-                    leads = response.json()
-                    today = datetime.now().strftime("%Y-%m-%d")
-                    return [l for l in leads if l['created_at'].startswith(today)]
-                return []
-            else:
-                response = await client.get(f"{BACKEND_URL}/api/leads?limit=20", timeout=10.0)
-                if response.status_code == 200:
-                    return response.json()
-                return []
+        return await cached(("leads", date_from), lambda: reader.leads(LEADS_SHOWN, date_from))
     except Exception as e:
         logger.error(f"Error fetching leads: {e}")
-        return None
+        return None, None
 
-async def get_stats_from_api():
-    """Fetch statistics from backend API"""
+async def get_stats(reader):
+    """Fetch landing statistics"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{BACKEND_URL}/api/stats", timeout=10.0)
-            if response.status_code == 200:
-                return response.json()
-            return None
+        return await cached(("stats",), reader.stats)
     except Exception as e:
         logger.error(f"Error fetching stats: {e}")
         return None
 
-def format_lead_message(leads, title):
-    """Format leads list for Telegram"""
+def format_lead_message(leads, title, total=None):
+    """Format leads list for Telegram; `total` is the number of matching leads if more exist"""
     if not leads:
         return f"📭 <b>{title}</b>\n\nНет заявок"
     
@@ -105,9 +166,10 @@ def format_lead_message(leads, title):
         "electronic": "🎧", "hip-hop": "🎤", "ambient": "🌙", "cinematic": "🎬"
     }
     
-    message = f"📋 <b>{title}</b> ({len(leads)} шт.)\n\n"
+    total = max(total or 0, len(leads))
+    message = f"📋 <b>{title}</b> ({total} шт.)\n\n"
     
-    for i, lead in enumerate(leads[:10], 1):  # Show max 10
+    for i, lead in enumerate(leads[:LEADS_SHOWN], 1):
         style = lead.get('style', 'unknown')
         emoji = style_emojis.get(style, '🎵')
         status = lead.get('status', 'new')
@@ -125,14 +187,14 @@ def format_lead_message(leads, title):
         
         message += (
             f"{i}. <b>#{lead['id']}</b> {status_emoji}\n"
-            f"   👤 {lead['name']}\n"
-            f"   📱 {lead.get('phone', '-')}\n"
-            f"   {emoji} {style.title()}\n"
+            f"   👤 {html.escape(lead['name'])}\n"
+            f"   📱 {html.escape(lead.get('phone') or '-')}\n"
+            f"   {emoji} {html.escape(style.title())}\n"
             f"   📝 {time_str}\n\n"
         )
     
-    if len(leads) > 10:
-        message += f"... и еще {len(leads) - 10} заявок\n"
+    if total > LEADS_SHOWN:
+        message += f"... и еще {total - LEADS_SHOWN} заявок\n"
     
     message += f"\n🔗 <a href='http://localhost:8000/admin'>Открыть панель админа</a>"
     
@@ -146,12 +208,12 @@ async def leads_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("⏳ Загружаю заявки...")
     
-    leads = await get_leads_from_api()
+    leads, total = await get_leads(context.bot_data["reader"])
     if leads is None:
         await update.message.reply_text("❌ Ошибка соединения с сервером")
         return
     
-    message = format_lead_message(leads, "Все заявки")
+    message = format_lead_message(leads, "Все заявки", total)
     await update.message.reply_text(message, parse_mode='HTML', disable_web_page_preview=True)
 
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -162,13 +224,13 @@ async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("⏳ Загружаю заявки за сегодня...")
     
-    leads = await get_leads_from_api(today_only=True)
+    leads, total = await get_leads(context.bot_data["reader"], today_only=True)
     if leads is None:
         await update.message.reply_text("❌ Ошибка соединения с сервером")
         return
     
-    today_str = datetime.now().strftime("%d.%m.%Y")
-    message = format_lead_message(leads, f"Заявки за {today_str}")
+    today_str = datetime.utcnow().strftime("%d.%m.%Y")
+    message = format_lead_message(leads, f"Заявки за {today_str}", total)
     await update.message.reply_text(message, parse_mode='HTML', disable_web_page_preview=True)
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -179,7 +241,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("⏳ Загружаю статистику...")
     
-    stats = await get_stats_from_api()
+    stats = await get_stats(context.bot_data["reader"])
     if stats is None:
         await update.message.reply_text("❌ Ошибка соединения с сервером")
         return
@@ -210,6 +272,69 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='HTML'
     )
 
+def build_application(webhook: bool = False, reader=None) -> Application:
+    """Application with all command handlers; without an updater when updates arrive by webhook.
+
+    Commands read leads and stats through `reader` (default: the backend's API).
+    """
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_BASE}/bot")
+        .post_init(start_reader)
+        .post_shutdown(stop_reader)
+    )
+    if webhook:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.bot_data["reader"] = reader or ApiReader()
+
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("leads", leads_command))
+    application.add_handler(CommandHandler("today", today_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    return application
+
+class WebhookBot:
+    """Bot running inside the backend process: updates are POSTed to BOT_WEBHOOK_PATH
+    and handed to the application's update queue, so the response to Telegram
+    doesn't wait for the command's reads and reply. `reader` is the backend's
+    in-process one: no HTTP round trip to itself, no ADMIN_API_TOKEN, no rate limiter"""
+
+    def __init__(self, secret: str, reader):
+        self.secret = secret
+        self.application = build_application(webhook=True, reader=reader)
+
+    def verify(self, secret_header: Optional[str]) -> bool:
+        return bool(self.secret) and secret_header is not None and secrets.compare_digest(secret_header, self.secret)
+
+    async def start(self):
+        # post_init/post_shutdown only run under run_polling(), so call the hooks here
+        await self.application.initialize()
+        await start_reader(self.application)
+        await self.application.start()
+
+    async def stop(self):
+        await self.application.stop()
+        await stop_reader(self.application)
+        await self.application.shutdown()
+
+    async def process(self, data: dict):
+        update = Update.de_json(data, self.application.bot)
+        if update is not None:
+            await self.application.update_queue.put(update)
+
+async def register_webhook():
+    """Point Telegram at BOT_WEBHOOK_URL; pending updates are kept"""
+    application = build_application(webhook=True)
+    async with application:
+        await application.bot.set_webhook(
+            BOT_WEBHOOK_URL, secret_token=BOT_WEBHOOK_SECRET, allowed_updates=ALLOWED_UPDATES
+        )
+    logger.info(f"Webhook set to {BOT_WEBHOOK_URL}")
+
 def main():
     """Start the bot"""
     if not TELEGRAM_BOT_TOKEN:
@@ -219,22 +344,21 @@ def main():
     if not TELEGRAM_ADMIN_ID:
         logger.error("TELEGRAM_ADMIN_ID not set!")
         return
+
+    if BOT_MODE == "webhook":
+        if not (BOT_WEBHOOK_URL and BOT_WEBHOOK_SECRET):
+            logger.error("BOT_WEBHOOK_URL and BOT_WEBHOOK_SECRET must be set in webhook mode!")
+            sys.exit(1)
+        # Updates are handled by the backend; all that is left here is telling Telegram where to send them
+        asyncio.run(register_webhook())
+        return
     
     logger.info("Starting admin bot...")
     logger.info(f"Backend URL: {BACKEND_URL}")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-    
-    # Add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("status", status_command))
-    application.add_handler(CommandHandler("leads", leads_command))
-    application.add_handler(CommandHandler("today", today_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    
-    # Start bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application = build_application()
+    # Start polling (removes a webhook left over from webhook mode)
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
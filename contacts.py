@@ -0,0 +1,38 @@
+"""
+Contact normalization
+One form of emails and phone numbers for duplicate detection, the search index
+and the admin panel's filters
+"""
+import re
+from typing import List
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_phone(phone: str) -> str:
+    """Digits only, Russian numbers in the 7XXXXXXXXXX form"""
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    elif len(digits) == 10 and digits.startswith("9"):
+        digits = "7" + digits
+    return digits
+
+
+def phone_prefixes(phone: str) -> List[str]:
+    """Normalized phones a typed, possibly incomplete number may be the start of.
+
+    "916 123" is looked up as both "916123" and "7916123", "8 916 123" as
+    "8916123" and "7916123": without its country code a local number is not
+    a prefix of the stored 7XXXXXXXXXX form.
+    """
+    digits = normalize_phone(phone)
+    prefixes = [digits] if digits else []
+    if 0 < len(digits) < 11:
+        if digits.startswith("8"):
+            prefixes.append("7" + digits[1:])
+        elif digits.startswith("9"):
+            prefixes.append("7" + digits)
+    return prefixes
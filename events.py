@@ -0,0 +1,101 @@
+"""
+In-process pub/sub for track status updates
+Fans each status transition out to every waiting SSE client
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class TrackEventHub:
+    """Fan-out hub for track status events.
+
+    Jobs running in this process publish directly. Jobs running elsewhere
+    (worker.py or another uvicorn worker) are picked up by a single watcher
+    task that, while anybody is subscribed, reads the status of all watched
+    tracks with one query per `poll_interval`. The number of waiting clients
+    never changes the number of DB queries.
+    """
+
+    def __init__(self, session_factory, model, poll_interval: float = 1.0, queue_size: int = 16):
+        self.session_factory = session_factory
+        self.model = model
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._last: Dict[int, tuple] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @asynccontextmanager
+    async def subscribe(self, track_id: int):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[track_id].add(queue)
+        self._ensure_watcher()
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(track_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[track_id]
+                    self._last.pop(track_id, None)
+
+    def publish(self, track_id: int, status: str, audio_url: Optional[str] = None):
+        """Send a status event to every subscriber of the track (duplicates are dropped)"""
+        state = (status, audio_url)
+        if self._last.get(track_id) == state:
+            return
+        queues = self._subscribers.get(track_id)
+        if not queues:
+            return
+        self._last[track_id] = state
+        event = {"id": track_id, "status": status, "audio_url": audio_url}
+        for queue in queues:
+            if queue.full():
+                # Slow client: keep only the newest state
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _ensure_watcher(self):
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        model = self.model
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            track_ids = list(self._subscribers)
+            if not track_ids:
+                break
+            try:
+                async with self.session_factory() as db:
+                    rows = (await db.execute(
+                        select(model.id, model.status, model.audio_url).where(model.id.in_(track_ids))
+                    )).all()
+            except Exception as e:
+                logger.warning(f"Track status watcher query failed: {e}")
+                continue
+            for track_id, status, audio_url in rows:
+                self.publish(track_id, status, audio_url)
+
+    async def aclose(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
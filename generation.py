@@ -0,0 +1,231 @@
+"""
+Music generation backends
+Suno API client, a local fake for development/tests, and a TrackGenerator front-end
+that limits concurrency, polls for completion and dedupes repeat prompts
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# One MPEG-1 Layer III frame (128 kbps, 44.1 kHz, mono) with all-zero side info: silence
+SILENT_MP3_FRAME = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+
+
+class GenerationError(Exception):
+    """The backend rejected or failed a generation request"""
+
+
+@dataclass
+class GenerationResult:
+    task_id: str
+    audio_url: str
+    duration: Optional[int] = None  # seconds, when the provider reports it
+
+
+class GenerationBackend(ABC):
+    """Interface every generation provider implements"""
+
+    name = "base"
+
+    @abstractmethod
+    async def submit(self, prompt: str, style: str, duration: int) -> str:
+        """Start a generation and return the provider's task id"""
+
+    @abstractmethod
+    async def poll(self, task_id: str) -> Optional[GenerationResult]:
+        """Return the result once the task is done, None while it is still running"""
+
+    @abstractmethod
+    def fetch_audio(self, result: GenerationResult) -> AsyncIterator[bytes]:
+        """Stream the finished audio file"""
+
+    async def aclose(self):
+        pass
+
+
+class SunoBackend(GenerationBackend):
+    """HTTP client for the Suno generation API"""
+
+    name = "suno"
+
+    def __init__(self, api_key: str, base_url: str, timeout: float = 30.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._client
+
+    async def submit(self, prompt: str, style: str, duration: int) -> str:
+        response = await self.client.post(
+            "/generate",
+            json={"prompt": prompt, "style": style, "duration": duration},
+        )
+        if response.status_code >= 400:
+            raise GenerationError(f"Suno submit failed ({response.status_code}): {response.text}")
+        data = response.json()
+        task_id = data.get("id") or data.get("task_id")
+        if not task_id:
+            raise GenerationError(f"Suno submit returned no task id: {data}")
+        return str(task_id)
+
+    async def poll(self, task_id: str) -> Optional[GenerationResult]:
+        response = await self.client.get(f"/generate/{task_id}")
+        if response.status_code >= 400:
+            raise GenerationError(f"Suno poll failed ({response.status_code}): {response.text}")
+        data = response.json()
+        status = data.get("status")
+        if status in ("complete", "completed", "succeeded"):
+            return GenerationResult(task_id=task_id, audio_url=data["audio_url"])
+        if status in ("error", "failed"):
+            raise GenerationError(f"Suno task {task_id} failed: {data.get('error', 'unknown error')}")
+        return None
+
+    async def fetch_audio(self, result: GenerationResult) -> AsyncIterator[bytes]:
+        async with self.client.stream("GET", result.audio_url) as response:
+            if response.status_code >= 400:
+                raise GenerationError(f"Suno audio download failed ({response.status_code})")
+            async for chunk in response.aiter_bytes(64 * 1024):
+                yield chunk
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeGenerationBackend(GenerationBackend):
+    """In-process stand-in that 'finishes' every task after `delay` seconds"""
+
+    name = "fake"
+
+    def __init__(self, delay: float = 10.0, base_url: str = "https://suno.fake/audio"):
+        self.delay = delay
+        self.base_url = base_url
+        self.submitted = 0
+        self._tasks: Dict[str, Tuple[float, int]] = {}  # task id -> (ready at, duration); dropped once done
+
+    async def submit(self, prompt: str, style: str, duration: int) -> str:
+        self.submitted += 1
+        task_id = uuid.uuid4().hex
+        self._tasks[task_id] = (time.monotonic() + self.delay, duration)
+        return task_id
+
+    async def poll(self, task_id: str) -> Optional[GenerationResult]:
+        task = self._tasks.get(task_id)
+        if task is None:
+            raise GenerationError(f"Unknown task {task_id}")
+        ready_at, duration = task
+        if time.monotonic() < ready_at:
+            return None
+        del self._tasks[task_id]
+        return GenerationResult(task_id=task_id, audio_url=f"{self.base_url}/{task_id}.mp3", duration=duration)
+
+    async def fetch_audio(self, result: GenerationResult) -> AsyncIterator[bytes]:
+        """Silent 128 kbps / 44.1 kHz mono MP3 of the requested duration"""
+        duration = result.duration or 30
+        frame = SILENT_MP3_FRAME
+        frames_per_chunk = 256
+        total = int(duration * 44100 / 1152)
+        for start in range(0, total, frames_per_chunk):
+            yield frame * min(frames_per_chunk, total - start)
+
+
+class TrackGenerator:
+    """Front-end over a GenerationBackend.
+
+    At most `max_in_flight` generations run against the provider at once.
+    Identical (prompt, style, duration) requests share one generation: while
+    it runs they await the same future, and afterwards they are answered from
+    a TTL cache without calling the provider again. A caller that fails to
+    download or store the audio calls `forget()`, so the next request
+    generates again instead of reusing a result that does not work.
+    """
+
+    def __init__(
+        self,
+        backend: GenerationBackend,
+        max_in_flight: int = 4,
+        poll_interval: float = 5.0,
+        timeout: float = 600.0,
+        cache_size: int = 1024,
+        cache_ttl: float = 86400.0,
+    ):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def cache_key(prompt: str, style: str, duration: int) -> str:
+        normalized = " ".join(prompt.lower().split())
+        return hashlib.sha256(f"{normalized}\x00{style}\x00{duration}".encode()).hexdigest()
+
+    async def generate(self, prompt: str, style: str, duration: int) -> Tuple[GenerationResult, bool]:
+        """Return (result, cached) for the request"""
+        key = self.cache_key(prompt, style, duration)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached, True
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._run(prompt, style, duration)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            self._cache.set(key, result)
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._in_flight[key]
+
+    def forget(self, prompt: str, style: str, duration: int):
+        """Drop the cached result for the request"""
+        self._cache.pop(self.cache_key(prompt, style, duration))
+
+    async def _run(self, prompt: str, style: str, duration: int) -> GenerationResult:
+        async with self._slots:
+            task_id = await self.backend.submit(prompt, style, duration)
+            logger.info(f"Submitted generation {task_id} to {self.backend.name}")
+            deadline = time.monotonic() + self.timeout
+            while True:
+                result = await self.backend.poll(task_id)
+                if result is not None:
+                    return result
+                if time.monotonic() >= deadline:
+                    raise GenerationError(f"Generation {task_id} timed out after {self.timeout}s")
+                await asyncio.sleep(self.poll_interval)
+
+    async def aclose(self):
+        await self.backend.aclose()
@@ -0,0 +1,127 @@
+"""
+Batched lead ingestion
+A single writer task collects submitted rows and inserts them in one transaction,
+so a burst of form submissions costs a few commits instead of one per lead
+"""
+import asyncio
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Group commit in front of one table.
+
+    `submit()` queues a row and resolves to `(instance, created)` once the
+    batch containing it is committed. The writer flushes when `max_batch`
+    rows are waiting or `max_delay` seconds after the first row of a batch
+    arrived, whichever comes first. If a batch fails, its rows are retried
+    one by one so a single bad row only fails its own caller.
+
+    `find_existing(db, values_list)` may return an already stored instance
+    for each queued row; those rows are answered with it (created=False)
+    instead of being inserted. It runs once per batch, inside the batch's
+    transaction. `on_insert(db, instances)` sees the new rows after they are
+    flushed (ids and defaults set) and before the commit, to keep derived
+    tables in the same transaction.
+    """
+
+    def __init__(self, session_factory, model, max_batch: int = 200, max_delay: float = 0.01,
+                 find_existing=None, on_insert=None):
+        self.session_factory = session_factory
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.find_existing = find_existing
+        self.on_insert = on_insert
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Commit what is queued (bounded by `timeout`) and stop the writer"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} queued rows on shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, **values) -> Tuple[Any, bool]:
+        if self._task is None:
+            raise RuntimeError("BatchWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((values, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Batch insert into {self.model.__tablename__} failed: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        pending = [(values, future) for values, future in batch if not future.cancelled()]
+        if not pending:
+            return
+        try:
+            async with self.session_factory() as db:
+                existing = [None] * len(pending)
+                if self.find_existing is not None:
+                    existing = await self.find_existing(db, [values for values, _ in pending])
+                rows = [found or self.model(**values) for found, (values, _) in zip(existing, pending)]
+                inserted = [row for row, found in zip(rows, existing) if found is None]
+                db.add_all(inserted)
+                if self.on_insert is not None and inserted:
+                    await db.flush()
+                    await self.on_insert(db, inserted)
+                await db.commit()
+        except Exception as e:
+            if len(pending) == 1:
+                self._resolve(pending[0][1], error=e)
+                return
+            logger.warning(f"Batch of {len(pending)} rows failed ({e}), retrying one by one")
+            for item in pending:
+                await self._flush([item])
+            return
+
+        self.batches += 1
+        self.rows += existing.count(None)
+        for row, found, (_, future) in zip(rows, existing, pending):
+            self._resolve(future, result=(row, found is None))
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, error: Optional[Exception] = None):
+        if future.done():
+            return  # caller went away
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
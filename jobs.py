@@ -0,0 +1,254 @@
+"""
+Durable track generation queue
+Jobs live in the track_requests table; workers claim them with a lease so a crashed
+or restarted process never loses work
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+
+class TrackJobQueue:
+    """Claim/lease job runner on top of the track_requests table.
+
+    A job is claimable when it is `pending` and due, or `processing` with an
+    expired lease (its worker died) and attempts left. A job whose worker died
+    on its last attempt is marked `failed` instead, so a job that crashes or
+    hangs its worker is not retried forever. Claiming is a conditional UPDATE, so two
+    workers racing for the same row cannot both win. While a job runs its lease
+    is renewed in the background; completion and failure are only recorded by
+    the lease holder.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        model,
+        handler: Callable[[object], Awaitable[str]],
+        concurrency: int = 2,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        retry_delay: float = 5.0,
+        worker_id: Optional[str] = None,
+        on_status: Optional[Callable[[int, str, Optional[str]], None]] = None,
+    ):
+        self.session_factory = session_factory
+        self.model = model
+        self.handler = handler
+        self.concurrency = concurrency
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.on_status = on_status
+        self._wakeup = asyncio.Event()
+        self._running: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _abandoned(self, now: datetime):
+        """Processing with an expired or missing lease: its worker died or hung"""
+        model = self.model
+        return and_(model.status == "processing", or_(model.locked_until.is_(None), model.locked_until < now))
+
+    def _claimable(self, now: datetime):
+        model = self.model
+        return or_(
+            and_(model.status == "pending", or_(model.run_after.is_(None), model.run_after <= now)),
+            and_(self._abandoned(now), model.attempts < self.max_attempts),
+        )
+
+    async def _fail_exhausted(self, db, now: datetime) -> List[int]:
+        """Mark abandoned jobs that used up their attempts as failed"""
+        model = self.model
+        exhausted = (await db.execute(
+            select(model.id).where(self._abandoned(now), model.attempts >= self.max_attempts)
+        )).scalars().all()
+        failed = []
+        for job_id in exhausted:
+            result = await db.execute(
+                update(model)
+                .where(model.id == job_id, self._abandoned(now), model.attempts >= self.max_attempts)
+                .values(
+                    status="failed",
+                    locked_by=None,
+                    locked_until=None,
+                    last_error=f"Worker lease expired on attempt {self.max_attempts}",
+                    updated_at=now,
+                )
+            )
+            if result.rowcount == 1:
+                failed.append(job_id)
+        if failed:
+            logger.warning(f"Track jobs {failed} failed: their worker died on the last attempt")
+        return failed
+
+    async def recover_stuck(self) -> int:
+        """Return jobs whose worker died (expired or missing lease) to the queue,
+        or fail them if that was their last attempt"""
+        model = self.model
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            failed = await self._fail_exhausted(db, now)
+            result = await db.execute(
+                update(model)
+                .where(self._abandoned(now), model.attempts < self.max_attempts)
+                .values(status="pending", locked_by=None, locked_until=None, run_after=None, updated_at=now)
+            )
+            await db.commit()
+        for job_id in failed:
+            self._emit(job_id, "failed")
+        if result.rowcount:
+            logger.info(f"Recovered {result.rowcount} stuck track jobs")
+        return result.rowcount
+
+    async def claim(self, limit: int) -> List[int]:
+        model = self.model
+        now = datetime.utcnow()
+        claimed = []
+        async with self.session_factory() as db:
+            failed = await self._fail_exhausted(db, now)
+            candidates = (await db.execute(
+                select(model.id).where(self._claimable(now)).order_by(model.id).limit(limit)
+            )).scalars().all()
+            for job_id in candidates:
+                result = await db.execute(
+                    update(model)
+                    .where(model.id == job_id, self._claimable(now))
+                    .values(
+                        status="processing",
+                        locked_by=self.worker_id,
+                        locked_until=now + self.lease,
+                        attempts=model.attempts + 1,
+                        updated_at=now,
+                    )
+                )
+                if result.rowcount == 1:
+                    claimed.append(job_id)
+            await db.commit()
+        for job_id in failed:
+            self._emit(job_id, "failed")
+        for job_id in claimed:
+            self._emit(job_id, "processing")
+        return claimed
+
+    def _emit(self, job_id: int, status: str, audio_url: Optional[str] = None):
+        if self.on_status is not None:
+            try:
+                self.on_status(job_id, status, audio_url)
+            except Exception as e:
+                logger.warning(f"Track status callback failed for {job_id}: {e}")
+
+    def notify(self):
+        """Wake the poller right away (a job was just enqueued in this process)"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop claiming and give running jobs `timeout` seconds to finish.
+
+        Jobs that don't finish keep their lease and are picked up again once it
+        expires.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        if self._running:
+            done, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run(self):
+        while not self._stopping:
+            free = self.concurrency - len(self._running)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await self.claim(free)
+                except Exception as e:
+                    logger.error(f"Error claiming track jobs: {e}")
+            for job_id in claimed:
+                self._running.add(asyncio.create_task(self._execute(job_id)))
+            if claimed and len(claimed) == free:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job_id: int):
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            async with self.session_factory() as db:
+                job = await db.get(self.model, job_id)
+            audio_url = await self.handler(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating track {job_id}: {e}")
+            await self._fail(job_id, str(e))
+        else:
+            await self._finish(job_id, status="completed", audio_url=audio_url, last_error=None)
+            logger.info(f"Track {job_id} generation completed")
+        finally:
+            heartbeat.cancel()
+            self._running.discard(asyncio.current_task())
+            self._wakeup.set()
+
+    async def _heartbeat(self, job_id: int):
+        model = self.model
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(model)
+                        .where(model.id == job_id, model.locked_by == self.worker_id)
+                        .values(locked_until=datetime.utcnow() + self.lease)
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Failed to renew lease for track {job_id}: {e}")
+
+    async def _fail(self, job_id: int, error: str):
+        async with self.session_factory() as db:
+            job = await db.get(self.model, job_id)
+            attempts = job.attempts if job else self.max_attempts
+        if attempts >= self.max_attempts:
+            await self._finish(job_id, status="failed", last_error=error)
+        else:
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            await self._finish(
+                job_id, status="pending", last_error=error,
+                run_after=datetime.utcnow() + timedelta(seconds=delay)
+            )
+
+    async def _finish(self, job_id: int, **values):
+        model = self.model
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(model)
+                .where(model.id == job_id, model.locked_by == self.worker_id)
+                .values(locked_by=None, locked_until=None, updated_at=datetime.utcnow(), **values)
+            )
+            await db.commit()
+        if result.rowcount == 1:
+            self._emit(job_id, values["status"], values.get("audio_url"))
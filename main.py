@@ -1,31 +1,59 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
-from datetime import datetime, timedelta
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, func
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, event, Column, String, Integer, Float, Date, DateTime, Text, Index, func, literal, select, update, and_, or_, inspect, text, bindparam
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.dialects import postgresql, sqlite
 import os
 import httpx
 import asyncio
 import logging
 import secrets
+from notifications import TelegramDispatcher
+from jobs import TrackJobQueue
+from generation import TrackGenerator, SunoBackend, FakeGenerationBackend
+from events import TrackEventHub, TERMINAL_STATUSES
+from static_assets import StaticAssetCache
+from ingest import BatchWriter
+from cache import TTLCache
+from rate_limit import RateLimitMiddleware, MemoryRateLimitStore, RedisRateLimitStore, parse_rules
+from session_store import MemorySessionStore, DatabaseSessionStore
+from track_storage import TrackStorage
+from contacts import normalize_email, normalize_phone
+from search import FTS_TABLE, fts_query, bm25_expression, create_search_index
+from profiling import RequestProfiler, SlowQueryLog, ProfilingMiddleware, instrument_engine as instrument_engine_profiling
+from metrics import Registry, Counter, Gauge, Histogram, MetricsMiddleware, MultiProcessSnapshots, instrument_engine, CONTENT_TYPE as METRICS_CONTENT_TYPE
+import time
+import base64
+import binascii
+import csv
+import io
+import json
+import zlib
+import html
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Suno AI Music Generator", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app = FastAPI(title="Suno AI Music Generator", version="1.0.0", lifespan=lifespan)
 
 # Database setup
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./leads.db")
@@ -33,6 +61,64 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def get_async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    return url
+
+# Async engine used by request handlers so DB I/O never blocks the event loop
+ASYNC_DATABASE_URL = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = ASYNC_DATABASE_URL.startswith("sqlite")
+
+# Connection pool settings. SQLite only allows one writer at a time, so it defaults
+# to a single pooled connection; server databases get SQLAlchemy's usual 5 + 10.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "1" if IS_SQLITE else "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0" if IS_SQLITE else "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def get_pool_options(url: str) -> dict:
+    """Pool kwargs for create_async_engine; in-memory SQLite keeps its StaticPool"""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        return {}
+    return {
+        # aiosqlite defaults to NullPool (a new connection + thread per session)
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_pool_options(ASYNC_DATABASE_URL))
+
+# SQLite: WAL lets readers run alongside the writer, and synchronous=NORMAL
+# fsyncs at checkpoints instead of on every commit (still crash-safe in WAL mode)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Database Models
 class Lead(Base):
     __tablename__ = "leads"
@@ -49,30 +135,335 @@ class Lead(Base):
     status = Column(String(20), default="new")
     created_at = Column(DateTime, default=datetime.utcnow)
     telegram_sent = Column(Integer, default=0)
+    # Contact keys for duplicate detection (see normalize_email / normalize_phone)
+    email_normalized = Column(String(100), nullable=True)
+    phone_normalized = Column(String(20), nullable=True)
+
+    __table_args__ = (
+        Index("ix_leads_created_at", "created_at"),
+        Index("ix_leads_status_created_at", "status", "created_at"),
+        Index("ix_leads_email_normalized_created_at", "email_normalized", "created_at"),
+        Index("ix_leads_phone_normalized_created_at", "phone_normalized", "created_at"),
+    )
+
+def new_track_token() -> str:
+    return secrets.token_urlsafe(16)
 
 class TrackRequest(Base):
     __tablename__ = "track_requests"
     
     id = Column(Integer, primary_key=True, index=True)
+    # Public handle of the track in API and audio URLs; ids are sequential and would let anyone list prompts
+    token = Column(String(32), nullable=True, default=new_track_token)
     lead_id = Column(Integer, nullable=True)
     prompt = Column(Text, nullable=False)
     style = Column(String(50), default="pop")
     status = Column(String(20), default="pending")
     audio_url = Column(String(500), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Job queue bookkeeping (see jobs.TrackJobQueue)
+    duration = Column(Integer, default=30, server_default="30")
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    run_after = Column(DateTime, nullable=True)
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_track_requests_lead_id_status", "lead_id", "status"),
+        Index("ix_track_requests_status_id", "status", "id"),
+        Index("ix_track_requests_token", "token", unique=True),
+    )
+
+class LeadDailyStat(Base):
+    """Lead counts per UTC day, style, source and status, kept up to date on every
+    insert and status change so analytics never scan the leads table"""
+    __tablename__ = "lead_daily_stats"
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+    day = Column(Date, primary_key=True)
+    style = Column(String(50), primary_key=True)
+    source = Column(String(50), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class AdminSession(Base):
+    __tablename__ = "admin_sessions"
+
+    token_hash = Column(String(64), primary_key=True)  # sha256 of the token
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+def add_missing_columns(bind, table):
+    """ALTER TABLE ... ADD COLUMN for model columns an existing table doesn't have yet"""
+    existing = {column["name"] for column in inspect(bind).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+        if column.server_default is not None:
+            ddl += f" DEFAULT {column.server_default.arg}"
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+        logger.info(f"Added column {table.name}.{column.name}")
+
+def backfill_contact_keys(bind, batch: int = 5000):
+    """Fill email_normalized / phone_normalized for leads created before those columns existed"""
+    total = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(Lead.id, Lead.email, Lead.phone).where(Lead.email_normalized.is_(None)).limit(batch)
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                update(Lead).where(Lead.id == bindparam("lead_id")).values(
+                    email_normalized=bindparam("email_key"), phone_normalized=bindparam("phone_key")
+                ),
+                [{"lead_id": row.id, "email_key": normalize_email(row.email or ""), "phone_key": normalize_phone(row.phone or "")} for row in rows]
+            )
+        total += len(rows)
+    if total:
+        logger.info(f"Backfilled contact keys for {total} leads")
+
+def track_audio_url(token: str) -> str:
+    return f"/tracks/{token}/audio.mp3"
+
+def backfill_track_tokens(bind, batch: int = 5000):
+    """Give tracks created before track_requests.token existed a token, and move their audio URL to it"""
+    total = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(TrackRequest.id, TrackRequest.audio_url).where(TrackRequest.token.is_(None)).limit(batch)
+            ).all()
+            if not rows:
+                break
+            values = []
+            for row in rows:
+                token = new_track_token()
+                values.append({"track_id": row.id, "new_token": token, "new_audio_url": track_audio_url(token) if row.audio_url else None})
+            conn.execute(
+                update(TrackRequest).where(TrackRequest.id == bindparam("track_id")).values(
+                    token=bindparam("new_token"), audio_url=bindparam("new_audio_url")
+                ),
+                values
+            )
+        total += len(rows)
+    if total:
+        logger.info(f"Backfilled tokens for {total} tracks")
+
+def rebuild_lead_rollups(bind):
+    """Recompute lead_daily_stats from the leads table in one transaction"""
+    day = func.date(Lead.created_at)
+    source = func.coalesce(Lead.source, "landing")
+    status = func.coalesce(Lead.status, "new")
+    with bind.begin() as conn:
+        conn.execute(LeadDailyStat.__table__.delete())
+        conn.execute(LeadDailyStat.__table__.insert().from_select(
+            ["day", "style", "source", "status", "count"],
+            select(day, Lead.style, source, status, func.count()).group_by(day, Lead.style, source, status)
+        ))
+    logger.info("Rebuilt lead_daily_stats")
+
+def backfill_lead_rollups(bind):
+    """Fill lead_daily_stats for leads created before the rollup table existed"""
+    with bind.connect() as conn:
+        has_rollups = conn.execute(select(LeadDailyStat.day).limit(1)).first() is not None
+        has_leads = conn.execute(select(Lead.id).limit(1)).first() is not None
+    if has_leads and not has_rollups:
+        rebuild_lead_rollups(bind)
+
+def run_migrations(bind):
+    """Create missing tables and bring existing databases up to date.
+
+    create_all() skips tables that already exist together with their indexes,
+    so columns and indexes added later are created one by one. Every step is
+    idempotent.
+    """
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        add_missing_columns(bind, table)
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    backfill_contact_keys(bind)
+    backfill_track_tokens(bind)
+    backfill_lead_rollups(bind)
+    if bind.dialect.name == "sqlite":
+        create_search_index(bind)
+
+# Schema setup: `uvicorn main:app` migrates on startup; serve.py migrates once before
+# forking its workers and turns this off for them
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
 
 # Config
 SUNO_API_KEY = os.getenv("SUNO_API_KEY", "")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_ADMIN_ID = os.getenv("TELEGRAM_ADMIN_ID", "")
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+TELEGRAM_API_URL = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}"
+TELEGRAM_MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))  # seconds between messages to one chat
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# Track generation worker: "inline" runs the job queue inside the web process,
+# "external" leaves it to `python worker.py`
+TRACK_WORKER_MODE = os.getenv("TRACK_WORKER_MODE", "inline")
+TRACK_WORKER_CONCURRENCY = int(os.getenv("TRACK_WORKER_CONCURRENCY", "2"))
+TRACK_JOB_LEASE = float(os.getenv("TRACK_JOB_LEASE", "60"))  # seconds
+TRACK_JOB_MAX_ATTEMPTS = int(os.getenv("TRACK_JOB_MAX_ATTEMPTS", "3"))
+
+# Generation backend: "fake" completes locally after a delay, "suno" talks to the Suno API
+# (opt-in: a SUNO_API_KEY alone, e.g. the .env placeholder, does not switch providers)
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "fake")
+SUNO_API_URL = os.getenv("SUNO_API_URL", "https://api.suno.ai/v1")
+GENERATION_MAX_IN_FLIGHT = int(os.getenv("GENERATION_MAX_IN_FLIGHT", "4"))
+GENERATION_POLL_INTERVAL = float(os.getenv("GENERATION_POLL_INTERVAL", "5"))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "600"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))
+FAKE_GENERATION_DELAY = float(os.getenv("FAKE_GENERATION_DELAY", "10"))
+
+# Generated audio files
+TRACKS_DIR = os.getenv("TRACKS_DIR", "./data/tracks")
+TRACKS_MAX_OPEN_FILES = int(os.getenv("TRACKS_MAX_OPEN_FILES", "64"))
+
+TRACK_EVENTS_POLL_INTERVAL = float(os.getenv("TRACK_EVENTS_POLL_INTERVAL", "1"))  # seconds
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))  # seconds
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")  # Change in production!
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")  # static bearer token for services such as bot.py
+# Admin logins: "database" shares sessions between workers, "memory" keeps them in this process
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "database")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))  # seconds
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))  # seconds
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))  # seconds, 0 disables caching
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))  # rows fetched per round trip
+SEARCH_RANK_LIMIT = int(os.getenv("SEARCH_RANK_LIMIT", "1000"))  # matches ranked by relevance; broader searches list newest first
+
+# Lead ingestion: "batch" inserts submissions through one writer task in grouped
+# transactions, "direct" commits each lead in its own request
+LEAD_INGEST_MODE = os.getenv("LEAD_INGEST_MODE", "batch")
+LEAD_BATCH_SIZE = int(os.getenv("LEAD_BATCH_SIZE", "200"))
+LEAD_BATCH_DELAY = float(os.getenv("LEAD_BATCH_DELAY_MS", "10")) / 1000
+
+# Duplicate submissions: repeats of an Idempotency-Key are remembered for
+# LEAD_IDEMPOTENCY_TTL; leads with the same email/phone within
+# LEAD_DUPLICATE_WINDOW seconds return the earlier lead (0 disables)
+LEAD_IDEMPOTENCY_TTL = float(os.getenv("LEAD_IDEMPOTENCY_TTL", "86400"))
+LEAD_IDEMPOTENCY_CACHE_SIZE = int(os.getenv("LEAD_IDEMPOTENCY_CACHE_SIZE", "10000"))
+LEAD_DUPLICATE_WINDOW = float(os.getenv("LEAD_DUPLICATE_WINDOW", "600"))
+
+# Per-IP / per-subnet token buckets for the public write endpoints (see rate_limit.py).
+# Behind a reverse proxy run uvicorn with --proxy-headers so the client IP is the real one.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_RULES = os.getenv(
+    "RATE_LIMIT_RULES",
+    "POST /api/leads: 5/minute ip, 30/minute subnet; POST /api/generate: 3/minute ip, 10/minute subnet; "
+    "POST /api/admin/login: 10/minute ip"
+)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_EXEMPT = [network.strip() for network in os.getenv("RATE_LIMIT_EXEMPT", "").split(",") if network.strip()]
+
+# App-lifetime HTTP client (keep-alive connections) and notification queue, set up on startup
+http_client: Optional[httpx.AsyncClient] = None
+telegram_dispatcher: Optional[TelegramDispatcher] = None
+track_queue: Optional[TrackJobQueue] = None
+lead_writer: Optional[BatchWriter] = None
+
+def create_rate_limit_store():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore(RATE_LIMIT_REDIS_URL)
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitStore()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+# Throttled requests are answered before the app, the database or Telegram see them
+rate_limit_store = create_rate_limit_store() if RATE_LIMIT_ENABLED else None
+if rate_limit_store is not None:
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=rate_limit_store,
+        rules=parse_rules(RATE_LIMIT_RULES),
+        exempt=RATE_LIMIT_EXEMPT
+    )
+
+# Added after the rate limiter so it wraps it: a 429 carries the CORS headers too,
+# and browsers report it as a 429 instead of a CORS error
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Duplicate-Of", "X-Total-Count", "X-Total-Count-Capped"],
+)
+
+# Opt-in profiling, switchable at runtime through /api/admin/profiling (per worker):
+# sampled cProfile of requests and a log of SQL statements slower than the threshold
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))  # share of requests profiled
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+request_profiler = RequestProfiler(sample_rate=PROFILING_SAMPLE_RATE, enabled=PROFILING_ENABLED)
+slow_query_log = SlowQueryLog(threshold=SLOW_QUERY_THRESHOLD_MS / 1000, enabled=SLOW_QUERY_LOG)
+instrument_engine_profiling(async_engine.sync_engine, slow_query_log)
+instrument_engine_profiling(engine, slow_query_log)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+# Prometheus metrics served on GET /metrics. Worker processes started by serve.py also
+# write snapshots to METRICS_MULTIPROC_DIR so a scrape of any worker covers all of them.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+metrics_registry = Registry()
+http_requests_total = Counter("http_requests_total", "HTTP requests by route template and status code", ["method", "route", "status"], registry=metrics_registry)
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"], registry=metrics_registry)
+http_requests_in_progress = Gauge("http_requests_in_progress", "HTTP requests being served", registry=metrics_registry)
+db_queries_total = Counter("db_queries_total", "SQL statements executed", ["operation"], registry=metrics_registry)
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement execution time", ["operation"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0), registry=metrics_registry)
+db_query_errors = Counter("db_query_errors_total", "SQL statements that raised", ["operation"], registry=metrics_registry)
+db_pool_checked_out = Gauge("db_pool_connections_in_use", "Pooled DB connections checked out", registry=metrics_registry)
+telegram_send_duration = Histogram("telegram_send_duration_seconds", "Telegram sendMessage calls by outcome", ["outcome"], registry=metrics_registry)
+telegram_queue_size = Gauge("telegram_queue_size", "Notifications waiting to be sent to Telegram", registry=metrics_registry)
+generation_duration = Histogram("track_generation_duration_seconds", "Track generation time (generate + store) by result", ["backend", "result"], buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0), registry=metrics_registry)
+generations_in_progress = Gauge("track_generations_in_progress", "Track generations running in this process", registry=metrics_registry)
+# Same query result in every worker, so a multi-process scrape must not add them up
+track_jobs = Gauge("track_jobs", "Track jobs in the queue by status", ["status"], merge="local", registry=metrics_registry)
+metrics_snapshots = MultiProcessSnapshots(metrics_registry, METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL) if METRICS_ENABLED and METRICS_MULTIPROC_DIR else None
+metrics_flusher: Optional[asyncio.Task] = None
+
+if METRICS_ENABLED:
+    instrument_engine(async_engine.sync_engine, db_queries_total, db_query_duration, db_query_errors)
+    instrument_engine(engine, db_queries_total, db_query_duration, db_query_errors)
+    db_pool_checked_out.set_function(lambda: async_engine.pool.checkedout() if isinstance(async_engine.pool, AsyncAdaptedQueuePool) else 0)
+    telegram_queue_size.set_function(lambda: telegram_dispatcher.queue.qsize() if telegram_dispatcher else 0)
+    # Added last, so it is outermost and also times requests rejected by the rate limiter
+    app.add_middleware(
+        MetricsMiddleware,
+        requests_total=http_requests_total,
+        request_duration=http_request_duration,
+        in_progress=http_requests_in_progress
+    )
+
+# Readiness probes reuse one DB check per READINESS_CACHE_TTL
+READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", "5"))  # seconds
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "2"))  # seconds
+readiness_cache = TTLCache(maxsize=1, ttl=READINESS_CACHE_TTL)
+app_ready = False
+
+# Lead deduplication: Idempotency-Key -> Lead, plus submissions still being inserted
+idempotency_cache = TTLCache(maxsize=LEAD_IDEMPOTENCY_CACHE_SIZE, ttl=LEAD_IDEMPOTENCY_TTL)
+leads_in_flight: dict = {}
+
+def create_session_store():
+    if SESSION_BACKEND == "database":
+        return DatabaseSessionStore(AsyncSessionLocal, AdminSession, ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL)
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore(ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL)
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
 
-# Simple session storage for admin auth (use Redis in production)
-admin_sessions = {}
+# Admin login sessions
+session_store = create_session_store()
 
 # Pydantic Models
 class LeadCreate(BaseModel):
@@ -100,6 +491,9 @@ class LeadResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class LeadSearchResult(LeadResponse):
+    score: Optional[float] = None  # bm25 relevance, lower is better
+
 class AdminLoginRequest(BaseModel):
     password: str
 
@@ -108,6 +502,12 @@ class AdminLoginResponse(BaseModel):
     token: Optional[str] = None
     message: str
 
+class ProfilingSettings(BaseModel):
+    profiling: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_queries: Optional[bool] = None
+    slow_query_ms: Optional[float] = Field(None, ge=0)
+
 class TrackGenerateRequest(BaseModel):
     prompt: str
     style: Optional[str] = "pop"
@@ -115,108 +515,577 @@ class TrackGenerateRequest(BaseModel):
     lead_id: Optional[int] = None
 
 class TrackResponse(BaseModel):
-    id: int
+    token: str
     prompt: str
     style: str
     status: str
     audio_url: Optional[str]
     created_at: datetime
+    
+    class Config:
+        from_attributes = True
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db(request: Request):
+    """Request-scoped async session, closed as soon as the endpoint's response is built
+    (see DbSessionRoute)"""
+    async with AsyncSessionLocal() as db:
+        request.scope["db_session"] = db
         yield db
-    finally:
-        db.close()
 
-async def send_telegram_notification(lead: Lead):
-    """Send notification to admin via Telegram bot"""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_ADMIN_ID:
-        logger.warning("Telegram bot not configured")
-        return False
-    
+class DbSessionRoute(APIRoute):
+    """Route that closes the request's get_db session once the endpoint has
+    returned and its result is serialized.
+
+    FastAPI runs the teardown of `yield` dependencies only after the response
+    has been sent, so without this every request would keep its pooled
+    connection (SQLite has just one) while the body goes out to the client.
+    Endpoints return loaded objects (expire_on_commit=False) and don't touch
+    the session afterwards.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def release_db_session(request: Request) -> Response:
+            try:
+                return await handler(request)
+            finally:
+                db = request.scope.pop("db_session", None)
+                if db is not None:
+                    await db.close()
+
+        return release_db_session
+
+app.router.route_class = DbSessionRoute
+
+def get_pool_stats() -> dict:
+    """Current connection pool gauges"""
+    pool = async_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+    }
+
+def encode_cursor(created_at: datetime, lead_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a lead"""
+    raw = f"{created_at.isoformat()}|{lead_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
     try:
-        style_emojis = {
-            "pop": "🎵",
-            "rock": "🎸", 
-            "jazz": "🎺",
-            "classical": "🎹",
-            "electronic": "🎧",
-            "hip-hop": "🎤",
-            "ambient": "🌙",
-            "cinematic": "🎬"
-        }
-        style_emoji = style_emojis.get(lead.style, "🎵")
-        style_name = lead.style.title() if lead.style else "Не указан"
-        
-        has_text_str = "✅ Да" if lead.has_text else "❌ Нет"
-        text_desc = lead.text_description if lead.has_text and lead.text_description else "-"
-        
-        message = f"""
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, lead_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(lead_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def lead_filters(
+    status: Optional[str] = None,
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> list:
+    """WHERE clauses shared by the lead list endpoints"""
+    conditions = []
+    if status:
+        conditions.append(Lead.status == status)
+    if style:
+        conditions.append(Lead.style == style)
+    if source:
+        conditions.append(Lead.source == source)
+    if date_from:
+        conditions.append(Lead.created_at >= date_from)
+    if date_to:
+        conditions.append(Lead.created_at < date_to)
+    return conditions
+
+def whole_day(value: Optional[datetime]) -> bool:
+    return value is None or (value.tzinfo is None and value.time() == datetime.min.time())
+
+async def count_leads(
+    db: AsyncSession,
+    status: Optional[str] = None,
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> int:
+    """Number of leads matching the list filters.
+
+    Ranges made of whole UTC days are summed from lead_daily_stats; a bound
+    inside a day falls back to COUNT(*) over the leads table.
+    """
+    if not (whole_day(date_from) and whole_day(date_to)):
+        return await db.scalar(select(func.count()).select_from(Lead).where(*lead_filters(status, style, source, date_from, date_to)))
+    conditions = []
+    for column, value in ((LeadDailyStat.status, status), (LeadDailyStat.style, style), (LeadDailyStat.source, source)):
+        if value:
+            conditions.append(column == value)
+    if date_from:
+        conditions.append(LeadDailyStat.day >= date_from.date())
+    if date_to:
+        conditions.append(LeadDailyStat.day < date_to.date())
+    return await db.scalar(select(func.coalesce(func.sum(LeadDailyStat.count), 0)).where(*conditions))
+
+def utc_today_start() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def stats_query():
+    """All landing counters as one SELECT.
+
+    Lead counters are sums over the lead_daily_stats rollup (a few rows per
+    day) instead of counts over the leads table.
+    """
+    today = utc_today_start().date()
+    total = func.coalesce(func.sum(LeadDailyStat.count), 0)
+    return select(
+        select(total).scalar_subquery(),
+        select(total).where(LeadDailyStat.status == "new").scalar_subquery(),
+        select(total).where(LeadDailyStat.day == today).scalar_subquery(),
+        select(func.count()).select_from(TrackRequest).scalar_subquery(),
+    )
+
+async def load_stats(db: AsyncSession) -> dict:
+    """Compute all landing counters in a single query"""
+    row = (await db.execute(stats_query())).one()
+    return {
+        "total_leads": row[0],
+        "new_leads": row[1],
+        "today_leads": row[2],
+        "total_tracks": row[3]
+    }
+
+class StatsCache:
+    """In-process cache of /api/stats counters.
+
+    Counters are reloaded from the DB at most once per TTL (or when the UTC day
+    rolls over) and are adjusted in place by the write endpoints in between.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._stats: Optional[dict] = None
+        self._loaded_at = 0.0
+        self._day = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._stats is not None
+            and self._day == utc_today_start()
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    async def get(self, db: AsyncSession) -> dict:
+        if self._is_fresh():
+            return dict(self._stats)
+        async with self._lock:
+            if not self._is_fresh():
+                day = utc_today_start()
+                self._stats = await load_stats(db)
+                self._day = day
+                self._loaded_at = time.monotonic()
+            return dict(self._stats)
+
+    def increment(self, key: str, delta: int = 1):
+        if self._stats is not None:
+            self._stats[key] += delta
+
+    def invalidate(self):
+        self._stats = None
+
+stats_cache = StatsCache(STATS_CACHE_TTL)
+
+def lead_rollup_key(lead: Lead, status: Optional[str] = None) -> tuple:
+    return (lead.created_at.date(), lead.style, lead.source or "landing", status or lead.status or "new")
+
+async def update_lead_rollups(db: AsyncSession, deltas: dict):
+    """Add {(day, style, source, status): delta} to lead_daily_stats with one upsert, in the caller's transaction"""
+    rows = [
+        {"day": day, "style": style, "source": source, "status": status, "count": delta}
+        for (day, style, source, status), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    insert = (sqlite if IS_SQLITE else postgresql).insert(LeadDailyStat)
+    await db.execute(insert.on_conflict_do_update(
+        index_elements=["day", "style", "source", "status"],
+        set_={"count": LeadDailyStat.count + insert.excluded["count"]}
+    ), rows)
+
+async def record_new_leads(db: AsyncSession, leads: List[Lead]):
+    deltas: dict = {}
+    for lead in leads:
+        key = lead_rollup_key(lead)
+        deltas[key] = deltas.get(key, 0) + 1
+    await update_lead_rollups(db, deltas)
+
+def format_lead_notification(lead: Lead) -> str:
+    """Admin notification text for a new lead (HTML, user input escaped)"""
+    style_emojis = {
+        "pop": "🎵",
+        "rock": "🎸", 
+        "jazz": "🎺",
+        "classical": "🎹",
+        "electronic": "🎧",
+        "hip-hop": "🎤",
+        "ambient": "🌙",
+        "cinematic": "🎬"
+    }
+    style_emoji = style_emojis.get(lead.style, "🎵")
+    style_name = html.escape(lead.style.title()) if lead.style else "Не указан"
+    
+    has_text_str = "✅ Да" if lead.has_text else "❌ Нет"
+    text_desc = html.escape(lead.text_description) if lead.has_text and lead.text_description else "-"
+    
+    message = f"""
 🔔 <b>НОВАЯ ЗАЯВКА С ЛЕНДИНГА!</b>
 
-👤 <b>Имя:</b> {lead.name}
-📧 <b>Email:</b> {lead.email}
-📱 <b>Телефон:</b> {lead.phone}
+👤 <b>Имя:</b> {html.escape(lead.name)}
+📧 <b>Email:</b> {html.escape(lead.email)}
+📱 <b>Телефон:</b> {html.escape(lead.phone)}
 
 🎵 <b>Музыкальный стиль:</b> {style_emoji} {style_name}
 � <b>Нужен текст:</b> {has_text_str}
 """
-        if lead.has_text and lead.text_description:
-            message += f"📄 <b>Описание текста:</b> {text_desc}\n"
-        
-        if lead.message:
-            message += f"\n� <b>Комментарий:</b> {lead.message}\n"
-        
-        message += f"""
+    if lead.has_text and lead.text_description:
+        message += f"📄 <b>Описание текста:</b> {text_desc}\n"
+    
+    if lead.message:
+        message += f"\n� <b>Комментарий:</b> {html.escape(lead.message)}\n"
+    
+    message += f"""
 🕐 <b>Время:</b> {lead.created_at.strftime('%d.%m.%Y %H:%M')}
 📊 <b>ID заявки:</b> #{lead.id}
 """
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_URL}/sendMessage",
-                json={
-                    "chat_id": TELEGRAM_ADMIN_ID,
-                    "text": message,
-                    "parse_mode": "HTML"
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Telegram notification sent for lead {lead.id}")
-                return True
-            else:
-                logger.error(f"Failed to send telegram notification: {response.text}")
-                return False
-                
-    except Exception as e:
-        logger.error(f"Error sending telegram notification: {e}")
-        return False
+    return message
+
+async def mark_telegram_sent(lead_ids: List[int]):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Lead).where(Lead.id.in_(lead_ids)).values(telegram_sent=1))
+        await db.commit()
+    logger.info(f"Telegram notification sent for leads {lead_ids}")
 
-async def process_track_generation(track_id: int, request: TrackGenerateRequest):
-    """Process track generation asynchronously"""
-    db = SessionLocal()
+async def send_telegram_notification(lead: Lead):
+    """Queue notification to admin via Telegram bot"""
+    if telegram_dispatcher is None:
+        logger.warning("Telegram bot not configured")
+        return False
     
     try:
-        await asyncio.sleep(10)
-        
-        track = db.query(TrackRequest).filter(TrackRequest.id == track_id).first()
-        if track:
-            track.status = "completed"
-            track.audio_url = f"/tracks/{track_id}/audio.mp3"
-            db.commit()
-            logger.info(f"Track {track_id} generation completed")
-            
+        telegram_dispatcher.enqueue(lead.id, format_lead_notification(lead))
+        return True
     except Exception as e:
-        logger.error(f"Error generating track {track_id}: {e}")
-        track = db.query(TrackRequest).filter(TrackRequest.id == track_id).first()
-        if track:
-            track.status = "failed"
-            db.commit()
+        logger.error(f"Error queueing telegram notification: {e}")
+        return False
+
+def create_track_generator() -> TrackGenerator:
+    if GENERATION_BACKEND == "suno":
+        if not SUNO_API_KEY:
+            raise ValueError("GENERATION_BACKEND=suno needs SUNO_API_KEY")
+        backend = SunoBackend(SUNO_API_KEY, SUNO_API_URL, timeout=HTTP_TIMEOUT)
+    elif GENERATION_BACKEND == "fake":
+        backend = FakeGenerationBackend(delay=FAKE_GENERATION_DELAY)
+    else:
+        raise ValueError(f"Unknown GENERATION_BACKEND: {GENERATION_BACKEND}")
+    return TrackGenerator(
+        backend,
+        max_in_flight=GENERATION_MAX_IN_FLIGHT,
+        poll_interval=GENERATION_POLL_INTERVAL,
+        timeout=GENERATION_TIMEOUT,
+        cache_ttl=GENERATION_CACHE_TTL
+    )
+
+track_generator = create_track_generator()
+track_storage = TrackStorage(TRACKS_DIR, max_open_files=TRACKS_MAX_OPEN_FILES)
+
+async def process_track_generation(track: TrackRequest) -> str:
+    """Generate the audio for a claimed track job, store it and return its URL"""
+    started = time.perf_counter()
+    outcome = "error"
+    generations_in_progress.inc()
+    try:
+        request = (track.prompt, track.style or "pop", track.duration or 30)
+        result, cached = await track_generator.generate(*request)
+        if cached:
+            logger.info(f"Track {track.id} served from generation cache")
+        try:
+            size = await track_storage.save(track.id, track_generator.backend.fetch_audio(result))
+        except Exception:
+            # Retries (and identical prompts) must not be answered with this result again
+            track_generator.forget(*request)
+            raise
+        logger.info(f"Stored track {track.id} ({size} bytes)")
+        outcome = "cached" if cached else "generated"
+        return track_audio_url(track.token)
     finally:
-        db.close()
+        generations_in_progress.dec()
+        generation_duration.labels(GENERATION_BACKEND, outcome).observe(time.perf_counter() - started)
+
+# Status updates for SSE clients of this process
+track_events = TrackEventHub(AsyncSessionLocal, TrackRequest, poll_interval=TRACK_EVENTS_POLL_INTERVAL)
+
+def create_track_queue(on_status=None) -> TrackJobQueue:
+    return TrackJobQueue(
+        AsyncSessionLocal,
+        TrackRequest,
+        process_track_generation,
+        concurrency=TRACK_WORKER_CONCURRENCY,
+        lease_seconds=TRACK_JOB_LEASE,
+        max_attempts=TRACK_JOB_MAX_ATTEMPTS,
+        on_status=on_status
+    )
+
+def record_telegram_send(duration: float, outcome: str):
+    telegram_send_duration.labels(outcome).observe(duration)
+
+async def start_metrics_flusher():
+    global metrics_flusher
+    if metrics_snapshots is not None:
+        metrics_flusher = asyncio.create_task(metrics_snapshots.run())
+
+async def stop_metrics_flusher():
+    """Cancel the periodic flush and write the final values of this worker"""
+    global metrics_flusher
+    if metrics_flusher is not None:
+        metrics_flusher.cancel()
+        try:
+            await metrics_flusher
+        except asyncio.CancelledError:
+            pass
+        metrics_flusher = None
+    if metrics_snapshots is not None:
+        try:
+            metrics_snapshots.write()
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+async def start_http_client():
+    global http_client, telegram_dispatcher
+    http_client = httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+    )
+    if TELEGRAM_BOT_TOKEN and TELEGRAM_ADMIN_ID:
+        telegram_dispatcher = TelegramDispatcher(
+            http_client,
+            TELEGRAM_API_URL,
+            TELEGRAM_ADMIN_ID,
+            min_interval=TELEGRAM_MIN_INTERVAL,
+            on_delivered=mark_telegram_sent,
+            on_send=record_telegram_send
+        )
+        telegram_dispatcher.start()
+
+async def start_session_sweeper():
+    session_store.start()
+
+async def stop_session_sweeper():
+    await session_store.aclose()
+
+async def start_lead_writer():
+    global lead_writer
+    if LEAD_INGEST_MODE != "batch":
+        return
+    lead_writer = BatchWriter(
+        AsyncSessionLocal,
+        Lead,
+        max_batch=LEAD_BATCH_SIZE,
+        max_delay=LEAD_BATCH_DELAY,
+        find_existing=find_recent_leads,
+        on_insert=record_new_leads
+    )
+    lead_writer.start()
+
+async def stop_lead_writer():
+    global lead_writer
+    if lead_writer:
+        await lead_writer.stop()
+        lead_writer = None
+
+async def start_track_worker():
+    global track_queue
+    if TRACK_WORKER_MODE != "inline":
+        return
+    track_queue = create_track_queue(on_status=track_events.publish)
+    await track_queue.recover_stuck()
+    track_queue.start()
+
+async def stop_track_worker():
+    global track_queue
+    if track_queue:
+        await track_queue.stop()
+        track_queue = None
+    await track_generator.aclose()
+    await track_events.aclose()
+    track_storage.close()
+
+async def stop_rate_limit_store():
+    if rate_limit_store is not None:
+        await rate_limit_store.aclose()
+
+async def stop_http_client():
+    global http_client, telegram_dispatcher
+    if telegram_dispatcher:
+        await telegram_dispatcher.stop()
+        telegram_dispatcher = None
+    if http_client:
+        await http_client.aclose()
+        http_client = None
+
+# Telegram bot in webhook mode (BOT_MODE=webhook): commands arrive as POSTs to
+# bot.BOT_WEBHOOK_PATH and are handled in this process instead of a polling bot.py
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+webhook_bot = None
+
+class LocalLeadsReader:
+    """Bot reads served straight from the database, the in-process counterpart
+    of bot.ApiReader: no HTTP round trip to ourselves, no admin token, no rate limiter"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def leads(self, limit: int, date_from: Optional[datetime] = None):
+        """(newest leads as JSON dicts, number of leads matching), like GET /api/leads?count=true"""
+        query = (
+            select(Lead)
+            .where(*lead_filters(None, None, None, date_from, None))
+            .order_by(Lead.created_at.desc(), Lead.id.desc())
+            .limit(limit)
+        )
+        async with AsyncSessionLocal() as db:
+            leads = (await db.execute(query)).scalars().all()
+            total = await count_leads(db, None, None, None, date_from, None)
+        return [LeadResponse.model_validate(lead).model_dump(mode="json") for lead in leads], total
+
+    async def stats(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            return await stats_cache.get(db)
+
+async def start_webhook_bot():
+    global webhook_bot
+    if BOT_MODE != "webhook":
+        return
+    import bot  # python-telegram-bot is only needed in this mode
+    if not (TELEGRAM_BOT_TOKEN and TELEGRAM_ADMIN_ID and bot.BOT_WEBHOOK_SECRET):
+        logger.error("BOT_MODE=webhook needs TELEGRAM_BOT_TOKEN, TELEGRAM_ADMIN_ID and BOT_WEBHOOK_SECRET; webhook disabled")
+        return
+    candidate = bot.WebhookBot(bot.BOT_WEBHOOK_SECRET, LocalLeadsReader())
+    try:
+        await candidate.start()
+    except Exception as e:
+        logger.error(f"Telegram webhook bot failed to start: {e}")
+        return
+    webhook_bot = candidate
+
+async def stop_webhook_bot():
+    global webhook_bot
+    if webhook_bot is not None:
+        await webhook_bot.stop()
+        webhook_bot = None
+
+async def startup():
+    """Lifespan start: everything a worker needs before it takes traffic"""
+    global app_ready
+    if AUTO_MIGRATE:
+        await run_in_threadpool(run_migrations, engine)
+    # Compressed at full strength here, so requests never pay for brotli 11
+    await run_in_threadpool(static_assets.preload)
+    await start_http_client()
+    await start_session_sweeper()
+    await start_lead_writer()
+    await start_track_worker()
+    await start_metrics_flusher()
+    await start_webhook_bot()
+    app_ready = True
+    logger.info(f"Worker {os.getpid()} ready")
+
+async def shutdown():
+    """Lifespan end, after uvicorn stopped accepting requests and let running ones finish.
+
+    Producers are drained before what they feed: running generations finish,
+    queued leads are committed, then their Telegram notifications are flushed
+    before the HTTP client and the DB pool are closed.
+    """
+    global app_ready
+    app_ready = False
+    await stop_webhook_bot()
+    await stop_track_worker()
+    await stop_lead_writer()
+    await stop_http_client()
+    await stop_session_sweeper()
+    await stop_rate_limit_store()
+    await stop_metrics_flusher()
+    await async_engine.dispose()
+    logger.info(f"Worker {os.getpid()} stopped")
+
+async def check_database() -> Optional[str]:
+    """None if the DB answers, else the error; cached for READINESS_CACHE_TTL"""
+    cached = readiness_cache.get("database")
+    if cached is not None:
+        return cached or None
+    try:
+        async with AsyncSessionLocal() as db:
+            await asyncio.wait_for(db.execute(text("SELECT 1")), READINESS_DB_TIMEOUT)
+        error = ""
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    readiness_cache.set("database", error)
+    return error or None
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker's event loop is responsive"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: started, not shutting down and the DB is reachable (checked at most every READINESS_CACHE_TTL)"""
+    checks = {"lifespan": "ok" if app_ready else "starting or stopping"}
+    if app_ready:
+        db_error = await check_database()
+        checks["database"] = db_error or "ok"
+    ready = all(value == "ok" for value in checks.values())
+    return JSONResponse({"status": "ready" if ready else "unavailable", "checks": checks}, status_code=200 if ready else 503)
+
+async def update_track_job_counts():
+    """Queue depth by status: one grouped count per scrape"""
+    counts = {"pending": 0, "processing": 0}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TrackRequest.status, func.count())
+            .where(TrackRequest.status.in_(list(counts)))
+            .group_by(TrackRequest.status)
+        )
+        counts.update(dict(result.all()))
+    for status, count in counts.items():
+        track_jobs.labels(status).set(count)
+
+@app.post("/telegram/webhook", include_in_schema=False)
+async def telegram_webhook(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(None)):
+    """Updates from Telegram for the bot in webhook mode"""
+    if webhook_bot is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not webhook_bot.verify(x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid update")
+    await webhook_bot.process(data)
+    return {"ok": True}
 
 @app.get("/api")
 async def api_root():
@@ -224,123 +1093,485 @@ async def api_root():
 
 # Get absolute path to files
 import os
-BASE_DIR = "/app"  # Docker container working directory
+BASE_DIR = os.getenv("APP_DIR", "/app")  # Docker container working directory
+
+# Static files are served from memory (see static_assets.py)
+static_assets = StaticAssetCache(os.path.join(BASE_DIR, "static"))
+
+async def serve_asset(request: Request, rel_path: str) -> Response:
+    asset = await static_assets.aget(rel_path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return static_assets.response(request, asset)
 
 @app.get("/")
-async def root():
-    return FileResponse(os.path.join(BASE_DIR, "static/index.html"))
+async def root(request: Request):
+    return await serve_asset(request, "index.html")
 
 @app.get("/admin")
-async def admin_page():
-    return FileResponse(os.path.join(BASE_DIR, "static/admin.html"))
+async def admin_page(request: Request):
+    return await serve_asset(request, "admin.html")
 
 # Admin Authentication
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return None
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    """Dependency for admin-only endpoints: `Authorization: Bearer <session token or ADMIN_API_TOKEN>`"""
+    token = bearer_token(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if ADMIN_API_TOKEN and secrets.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+        return
+    if await session_store.get(token) is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+
 @app.post("/api/admin/login")
 async def admin_login(request: AdminLoginRequest):
     """Admin login endpoint"""
-    if request.password != ADMIN_PASSWORD:
+    if not secrets.compare_digest(request.password.encode(), ADMIN_PASSWORD.encode()):
         raise HTTPException(status_code=401, detail="Invalid password")
     
-    # Generate session token
-    token = secrets.token_urlsafe(32)
-    admin_sessions[token] = {
-        "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(hours=24)
-    }
-    
+    token = await session_store.create()
     return {"success": True, "token": token, "message": "Login successful"}
 
 @app.get("/api/admin/verify")
-async def verify_admin_token(token: str):
+async def verify_admin_token(token: Optional[str] = None, authorization: Optional[str] = Header(None)):
     """Verify admin token"""
-    session = admin_sessions.get(token)
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    if datetime.utcnow() > session["expires_at"]:
-        del admin_sessions[token]
-        raise HTTPException(status_code=401, detail="Token expired")
+    token = token or bearer_token(authorization)
+    if not token or await session_store.get(token) is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     return {"valid": True}
 
+@app.post("/api/admin/logout")
+async def admin_logout(authorization: Optional[str] = Header(None)):
+    """End the admin session"""
+    token = bearer_token(authorization)
+    if token:
+        await session_store.delete(token)
+    return {"success": True}
+
+async def wait_for_duplicate(idempotency_key: Optional[str], dedupe_keys: List[str]) -> Optional[Lead]:
+    """Lead a repeat submission resolves to from memory: the Idempotency-Key cache or a concurrent insert"""
+    while True:
+        if idempotency_key:
+            cached = idempotency_cache.get(idempotency_key)
+            if cached is not None:
+                return cached
+        pending = next((leads_in_flight[key] for key in dedupe_keys if key in leads_in_flight), None)
+        if pending is None:
+            return None
+        original = await asyncio.shield(pending)
+        if original is not None:
+            return original
+
+async def find_recent_leads(db: AsyncSession, rows: List[dict]) -> List[Optional[Lead]]:
+    """For each new lead's values, a stored lead with the same email or phone within LEAD_DUPLICATE_WINDOW"""
+    if LEAD_DUPLICATE_WINDOW <= 0:
+        return [None] * len(rows)
+    emails = {row["email_normalized"] for row in rows}
+    phones = {row["phone_normalized"] for row in rows if row["phone_normalized"]}
+    contacts = [Lead.email_normalized.in_(emails)]
+    if phones:
+        contacts.append(Lead.phone_normalized.in_(phones))
+    since = datetime.utcnow() - timedelta(seconds=LEAD_DUPLICATE_WINDOW)
+    matches = (await db.execute(
+        select(Lead).where(or_(*contacts), Lead.created_at >= since).order_by(Lead.created_at)
+    )).scalars().all()
+    by_email, by_phone = {}, {}
+    for match in matches:  # oldest first, so the newest match wins
+        by_email[match.email_normalized] = match
+        if match.phone_normalized:  # no digits is not a phone number two leads can share
+            by_phone[match.phone_normalized] = match
+    return [
+        by_email.get(row["email_normalized"]) or (by_phone.get(row["phone_normalized"]) if row["phone_normalized"] else None)
+        for row in rows
+    ]
+
+def duplicate_lead(idempotency_key: Optional[str], original: Lead) -> JSONResponse:
+    """Answer to a repeat submission: just the original's id.
+
+    The caller may have supplied nothing but a matching email or phone, so the
+    stored lead is not echoed back (reading leads requires admin auth).
+    """
+    if idempotency_key:
+        idempotency_cache.set(idempotency_key, original)
+    logger.info(f"Duplicate lead submission for {original.id} - {original.email}")
+    return JSONResponse({"id": original.id, "duplicate": True}, headers={"X-Duplicate-Of": str(original.id)})
+
 @app.post("/api/leads", response_model=LeadResponse)
-async def create_lead(lead: LeadCreate, background_tasks: BackgroundTasks):
-    """Create new lead and send telegram notification"""
-    db = next(get_db())
-    
+async def create_lead(
+    lead: LeadCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create new lead and send telegram notification.
+
+    A repeated Idempotency-Key, or the same email/phone again within
+    LEAD_DUPLICATE_WINDOW, inserts nothing and returns only the original
+    lead's id (`{"id": ..., "duplicate": true}`, with X-Duplicate-Of).
+    """
+    email_key = normalize_email(lead.email)
+    phone_key = normalize_phone(lead.phone)
+    dedupe_keys = [f"key:{idempotency_key}"] if idempotency_key else []
+    if LEAD_DUPLICATE_WINDOW > 0:
+        dedupe_keys.append(f"email:{email_key}")
+        if phone_key:
+            dedupe_keys.append(f"phone:{phone_key}")
+
+    original = await wait_for_duplicate(idempotency_key, dedupe_keys)
+    if original is not None:
+        return duplicate_lead(idempotency_key, original)
+
+    # Until this submission is stored, repeats (double clicks) wait for it instead of racing it
+    in_flight = asyncio.get_running_loop().create_future()
+    for key in dedupe_keys:
+        leads_in_flight[key] = in_flight
+
+    values = dict(
+        name=lead.name,
+        email=lead.email,
+        phone=lead.phone,
+        style=lead.style,
+        has_text=1 if lead.has_text else 0,
+        text_description=lead.text_description,
+        message=lead.message,
+        source=lead.source,
+        email_normalized=email_key,
+        phone_normalized=phone_key
+    )
+    db_lead = None
     try:
-        db_lead = Lead(
-            name=lead.name,
-            email=lead.email,
-            phone=lead.phone,
-            style=lead.style,
-            has_text=1 if lead.has_text else 0,
-            text_description=lead.text_description,
-            message=lead.message,
-            source=lead.source
-        )
-        db.add(db_lead)
-        db.commit()
-        db.refresh(db_lead)
+        if lead_writer is not None:
+            db_lead, created = await lead_writer.submit(**values)
+        else:
+            db_lead = (await find_recent_leads(db, [values]))[0]
+            created = db_lead is None
+            if created:
+                db_lead = Lead(**values)
+                db.add(db_lead)
+                await db.flush()
+                await record_new_leads(db, [db_lead])
+                await db.commit()
+                await db.refresh(db_lead)
+        if not created:
+            return duplicate_lead(idempotency_key, db_lead)
+        if idempotency_key:
+            idempotency_cache.set(idempotency_key, db_lead)
         
         logger.info(f"Lead created: {db_lead.id} - {db_lead.email}")
-        background_tasks.add_task(send_telegram_notification, db_lead)
+        stats_cache.increment("total_leads")
+        stats_cache.increment("today_leads")
+        if db_lead.status == "new":
+            stats_cache.increment("new_leads")
+        await send_telegram_notification(db_lead)
         
         return db_lead
         
     except Exception as e:
-        db.rollback()
+        db_lead = None
+        await db.rollback()
         logger.error(f"Error creating lead: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        in_flight.set_result(db_lead)
+        for key in dedupe_keys:
+            if leads_in_flight.get(key) is in_flight:
+                del leads_in_flight[key]
+
+@app.get("/api/leads", response_model=List[LeadResponse], dependencies=[Depends(require_admin)])
+async def list_leads(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    count: bool = False,
+    admin: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """List leads, newest first.
 
-@app.get("/api/leads", response_model=List[LeadResponse])
-async def list_leads(skip: int = 0, limit: int = 100, admin: bool = False):
-    """List all leads with optional admin access"""
-    db = next(get_db())
-    leads = db.query(Lead).order_by(Lead.created_at.desc()).offset(skip).limit(limit).all()
+    Pass the X-Next-Cursor response header back as `cursor` to get the next
+    page; `skip` still works but gets slower the deeper it goes. With
+    `count=true` the number of leads matching the filters is returned in
+    X-Total-Count.
+    """
+    query = select(Lead).where(*lead_filters(status, style, source, date_from, date_to))
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Lead.created_at < cursor_created_at,
+            and_(Lead.created_at == cursor_created_at, Lead.id < cursor_id)
+        ))
+    query = query.order_by(Lead.created_at.desc(), Lead.id.desc()).offset(skip).limit(limit + 1)
+    
+    leads = (await db.execute(query)).scalars().all()
+    if len(leads) > limit:
+        leads = leads[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(leads[-1].created_at, leads[-1].id)
+    if count:
+        response.headers["X-Total-Count"] = str(await count_leads(db, status, style, source, date_from, date_to))
     return leads
 
-@app.get("/api/leads/{lead_id}", response_model=LeadResponse)
-async def get_lead(lead_id: int):
+EXPORT_COLUMNS = [
+    "id", "name", "email", "phone", "style", "has_text", "text_description",
+    "message", "source", "status", "created_at"
+]
+
+async def iter_export_rows(query, fmt: str, compress: bool):
+    """Yield encoded export chunks, EXPORT_CHUNK_SIZE rows at a time.
+
+    `query` must be ordered by (created_at DESC, id DESC). Every chunk is read
+    in its own short session and continues after the last (created_at, id)
+    seen, so a slow download never holds a pooled connection (SQLite has just
+    one) between chunks.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip container
+    
+    def encode(rows, header=False) -> bytes:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if header:
+                writer.writerow(EXPORT_COLUMNS)
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in rows
+            )
+            data = buffer.getvalue().encode("utf-8")
+        else:
+            data = "".join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=datetime.isoformat) + "\n"
+                for row in rows
+            ).encode("utf-8")
+        return compressor.compress(data) if compressor else data
+    
+    if fmt == "csv":
+        yield encode([], header=True)
+    page = query
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(page.limit(EXPORT_CHUNK_SIZE))).all()
+        if rows:
+            chunk = encode(rows)
+            if chunk:
+                yield chunk
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            break
+        last = rows[-1]
+        page = query.where(or_(
+            Lead.created_at < last.created_at,
+            and_(Lead.created_at == last.created_at, Lead.id < last.id)
+        ))
+    if compressor:
+        yield compressor.flush()
+
+def search_filters(q: str) -> Optional[list]:
+    """Unranked fallback for databases without FTS5: every word must occur in one of the columns"""
+    conditions = []
+    for word in q.split():
+        pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(*[column.ilike(pattern, escape="\\") for column in
+                                (Lead.name, Lead.email, Lead.phone, Lead.message, Lead.text_description)]))
+    return conditions or None
+
+@app.get("/api/leads/search", response_model=List[LeadSearchResult], dependencies=[Depends(require_admin)])
+async def search_leads(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0, le=10000),
+    limit: int = Query(20, ge=1, le=100),
+    status: Optional[str] = None,
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Full-text search over name, email, phone, message and text description.
+
+    Up to SEARCH_RANK_LIMIT matches are ordered by relevance; broader queries
+    are listed newest first, since ranking every lead containing "gmail" helps
+    nobody. X-Total-Count holds the number of matches, capped at that limit
+    (X-Total-Count-Capped: true when there are more).
+    """
+    filters = lead_filters(status, style, source, date_from, date_to)
+    if IS_SQLITE:
+        match = fts_query(q)
+        if match is not None:
+            def search_query(ranked: bool):
+                score = bm25_expression() if ranked else "NULL"
+                hits = (
+                    text(f"SELECT rowid AS lead_id, {score} AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match")
+                    .bindparams(match=match)
+                    .columns(lead_id=Integer, score=Float)
+                    .subquery("hits")
+                )
+                query = select(Lead, hits.c.score).join(hits, Lead.id == hits.c.lead_id).where(*filters)
+                # hits.lead_id, not Lead.id: lets FTS5 walk its index newest first and stop early
+                return query.order_by(hits.c.score, hits.c.lead_id.desc()) if ranked else query.order_by(hits.c.lead_id.desc())
+    else:
+        match = search_filters(q)
+        if match is not None:
+            def search_query(ranked: bool):
+                return select(Lead, literal(None, Float)).where(*filters, *match).order_by(Lead.id.desc())
+    if match is None:
+        response.headers["X-Total-Count"] = "0"
+        return []
+
+    # Newest SEARCH_RANK_LIMIT + 1 matches: their number decides whether to rank, and
+    # for broad queries the requested page is usually among them already
+    matched_ids = (await db.execute(
+        search_query(False).with_only_columns(Lead.id).limit(SEARCH_RANK_LIMIT + 1)
+    )).scalars().all()
+    if len(matched_ids) > SEARCH_RANK_LIMIT:
+        response.headers["X-Total-Count"] = str(SEARCH_RANK_LIMIT)
+        response.headers["X-Total-Count-Capped"] = "true"
+        if skip + limit <= len(matched_ids):
+            query = select(Lead, literal(None, Float)).where(Lead.id.in_(matched_ids[skip:skip + limit])).order_by(Lead.id.desc())
+        else:
+            query = search_query(False).offset(skip).limit(limit)
+    else:
+        response.headers["X-Total-Count"] = str(len(matched_ids))
+        query = search_query(True).offset(skip).limit(limit)
+    rows = (await db.execute(query)).all()
+    return [LeadSearchResult.model_validate(lead).model_copy(update={"score": score}) for lead, score in rows]
+
+@app.get("/api/leads/export", dependencies=[Depends(require_admin)])
+async def export_leads(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    status: Optional[str] = None,
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
+    """Stream all matching leads as NDJSON or CSV with flat memory use"""
+    table = Lead.__table__
+    query = (
+        select(*[table.c[name] for name in EXPORT_COLUMNS])
+        .where(*lead_filters(status, style, source, date_from, date_to))
+        .order_by(Lead.created_at.desc(), Lead.id.desc())
+    )
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="leads.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(iter_export_rows(query, format, gzip), media_type=media_type, headers=headers)
+
+@app.get("/api/leads/{lead_id}", response_model=LeadResponse, dependencies=[Depends(require_admin)])
+async def get_lead(lead_id: int, db: AsyncSession = Depends(get_db)):
     """Get single lead details"""
-    db = next(get_db())
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
+    lead = await db.get(Lead, lead_id)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     return lead
 
-@app.put("/api/leads/{lead_id}/status")
-async def update_lead_status(lead_id: int, status: str):
+@app.put("/api/leads/{lead_id}/status", dependencies=[Depends(require_admin)])
+async def update_lead_status(lead_id: int, status: str, db: AsyncSession = Depends(get_db)):
     """Update lead status"""
-    db = next(get_db())
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
+    lead = await db.get(Lead, lead_id)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
+    old_status = lead.status
     lead.status = status
-    db.commit()
+    if status != old_status:
+        await update_lead_rollups(db, {lead_rollup_key(lead, old_status): -1, lead_rollup_key(lead, status): 1})
+    await db.commit()
+    stats_cache.increment("new_leads", (status == "new") - (old_status == "new"))
     return {"success": True, "message": f"Lead {lead_id} status updated to {status}"}
 
+def profiling_status() -> dict:
+    return {
+        "worker": os.getpid(),
+        "profiling": request_profiler.enabled,
+        "sample_rate": request_profiler.sample_rate,
+        "profiled_requests": request_profiler.profiled,
+        "slow_queries": slow_query_log.enabled,
+        "slow_query_ms": slow_query_log.threshold * 1000,
+        "slow_queries_logged": slow_query_log.total,
+        "recent_samples": list(request_profiler.samples)[-20:],
+    }
+
+@app.get("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Profiling switches of the worker that answers, and its latest sampled requests"""
+    return profiling_status()
+
+@app.put("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def update_profiling(settings: ProfilingSettings):
+    """Turn request sampling and the slow-query log on or off in this worker"""
+    if settings.profiling is not None:
+        request_profiler.enabled = settings.profiling
+    if settings.sample_rate is not None:
+        request_profiler.sample_rate = settings.sample_rate
+    if settings.slow_queries is not None:
+        slow_query_log.enabled = settings.slow_queries
+    if settings.slow_query_ms is not None:
+        slow_query_log.threshold = settings.slow_query_ms / 1000
+    logger.info(f"Profiling settings changed: {settings.model_dump(exclude_none=True)}")
+    return profiling_status()
+
+@app.delete("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def reset_profiling():
+    """Drop collected profiles and slow queries"""
+    request_profiler.clear()
+    slow_query_log.clear()
+    return profiling_status()
+
+@app.get("/api/admin/profiling/report", dependencies=[Depends(require_admin)])
+async def profiling_report(
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+    limit: int = Query(50, ge=1, le=500),
+    format: str = Query("text", pattern="^(text|pstats)$"),
+):
+    """Aggregated profile of the sampled requests: pstats table, or a .prof file for snakeviz"""
+    if format == "pstats":
+        return Response(
+            request_profiler.dump(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.prof"'}
+        )
+    return Response(request_profiler.report(sort, limit), media_type="text/plain")
+
+@app.get("/api/admin/profiling/slow-queries", dependencies=[Depends(require_admin)])
+async def slow_queries():
+    """SQL slower than the threshold: statement, parameter types and duration, newest first"""
+    return list(reversed(slow_query_log.entries))
+
 @app.post("/api/generate", response_model=TrackResponse)
-async def generate_track(request: TrackGenerateRequest, background_tasks: BackgroundTasks):
-    """Generate music track"""
-    db = next(get_db())
-    
+async def generate_track(request: TrackGenerateRequest, db: AsyncSession = Depends(get_db)):
+    """Queue a music track for generation"""
     try:
         track = TrackRequest(
             lead_id=request.lead_id,
             prompt=request.prompt,
             style=request.style,
-            status="processing"
+            duration=request.duration,
+            status="pending"
         )
         db.add(track)
-        db.commit()
-        db.refresh(track)
+        await db.commit()
+        await db.refresh(track)
+        stats_cache.increment("total_tracks")
         
-        background_tasks.add_task(process_track_generation, track.id, request)
+        if track_queue:
+            track_queue.notify()
         
         return TrackResponse(
-            id=track.id,
+            token=track.token,
             prompt=track.prompt,
             style=track.style,
             status=track.status,
@@ -349,87 +1580,179 @@ async def generate_track(request: TrackGenerateRequest, background_tasks: Backgr
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating track: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats")
-async def get_stats():
-    """Get landing statistics"""
-    db = next(get_db())
+async def find_track(db: AsyncSession, token: str) -> Optional[TrackRequest]:
+    return (await db.execute(select(TrackRequest).where(TrackRequest.token == token))).scalar_one_or_none()
+
+@app.get("/api/tracks/{token}", response_model=TrackResponse)
+async def get_track(token: str, db: AsyncSession = Depends(get_db)):
+    """Get track status"""
+    track = await find_track(db, token)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return track
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/tracks/{token}/events")
+async def track_status_events(token: str, request: Request):
+    """Server-Sent Events stream of track status changes, closed once the track is done"""
+    async with AsyncSessionLocal() as db:
+        track = await find_track(db, token)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    track_id = track.id
     
-    total_leads = db.query(Lead).count()
-    new_leads = db.query(Lead).filter(Lead.status == "new").count()
-    today_leads = db.query(Lead).filter(
-        Lead.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-    ).count()
-    total_tracks = db.query(TrackRequest).count()
+    async def stream():
+        async with track_events.subscribe(track_id) as queue:
+            # Read the current state only after subscribing so no transition is missed
+            async with AsyncSessionLocal() as db:
+                track = await db.get(TrackRequest, track_id)
+            last = (track.status, track.audio_url)
+            yield format_sse("status", {"token": token, "status": track.status, "audio_url": track.audio_url})
+            
+            while last[0] not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                state = (event["status"], event["audio_url"])
+                if state != last:
+                    last = state
+                    yield format_sse("status", {"token": token, "status": state[0], "audio_url": state[1]})
     
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.api_route("/tracks/{token}/audio.mp3", methods=["GET", "HEAD"])
+async def serve_track_audio(token: str, request: Request):
+    """Stream a generated track with HTTP Range support"""
+    async with AsyncSessionLocal() as db:
+        track_id = await db.scalar(select(TrackRequest.id).where(TrackRequest.token == token))
+    # Files are stored under the internal id
+    response = track_storage.response(request, track_id) if track_id is not None else None
+    if response is None:
+        raise HTTPException(status_code=404, detail="Track audio not found")
+    return response
+
+ANALYTICS_DIMENSIONS = {"style": LeadDailyStat.style, "source": LeadDailyStat.source, "status": LeadDailyStat.status}
+
+def analytics_period(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+@app.get("/api/analytics", dependencies=[Depends(require_admin)])
+async def lead_analytics(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    group_by: Optional[str] = Query(None, pattern="^(style|source|status)(,(style|source|status))*$"),
+    style: Optional[str] = None,
+    source: Optional[str] = None,
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Lead counts over time from the daily rollup (UTC days, last 30 by default).
+
+    `group_by` splits each period by style/source/status; without it every
+    period of the range is present, with 0 where there were no leads.
+    """
+    date_to = date_to or utc_today_start().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from is after date_to")
+    dimensions = list(dict.fromkeys(group_by.split(","))) if group_by else []
+    columns = [ANALYTICS_DIMENSIONS[name] for name in dimensions]
+    filters = [LeadDailyStat.day >= date_from, LeadDailyStat.day <= date_to]
+    for column, value in ((LeadDailyStat.style, style), (LeadDailyStat.source, source), (LeadDailyStat.status, status)):
+        if value:
+            filters.append(column == value)
+
+    result = await db.execute(
+        select(LeadDailyStat.day, *columns, func.sum(LeadDailyStat.count))
+        .where(*filters)
+        .group_by(LeadDailyStat.day, *columns)
+        .order_by(LeadDailyStat.day)
+    )
+    counts: dict = {}
+    if not dimensions:
+        day = date_from
+        while day <= date_to:
+            counts[(analytics_period(day, interval),)] = 0
+            day += timedelta(days=1)
+    for row in result.all():
+        key = (analytics_period(row[0], interval), *row[1:-1])
+        counts[key] = counts.get(key, 0) + row[-1]
+
+    series = [
+        {"period": key[0].isoformat(), **dict(zip(dimensions, key[1:])), "count": count}
+        for key, count in sorted(counts.items(), key=lambda item: item[0][0])
+    ]
     return {
-        "total_leads": total_leads,
-        "new_leads": new_leads,
-        "today_leads": today_leads,
-        "total_tracks": total_tracks
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "interval": interval,
+        "group_by": dimensions,
+        "total": sum(counts.values()),
+        "series": series
     }
 
-# Serve static files with no caching
-from fastapi.responses import Response
-import os.path
+@app.post("/api/analytics/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_analytics():
+    """Recompute the rollup from the leads table (after writes that bypassed the API)"""
+    await run_in_threadpool(rebuild_lead_rollups, engine)
+    stats_cache.invalidate()
+    return {"success": True}
+
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def metrics():
+    """Prometheus text exposition of this worker's metrics (plus the other workers' under serve.py)"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        await asyncio.wait_for(update_track_job_counts(), READINESS_DB_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not count track jobs for metrics: {e}")
+    others = metrics_snapshots.others() if metrics_snapshots is not None else ()
+    return Response(metrics_registry.render(others), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/pool", dependencies=[Depends(require_admin)])
+async def pool_status():
+    """Database connection pool pressure"""
+    return get_pool_stats()
+
+@app.get("/api/stats")
+async def get_stats(db: AsyncSession = Depends(get_db)):
+    """Get landing statistics"""
+    return await stats_cache.get(db)
 
 @app.get("/static/{file_path:path}")
-async def serve_static(file_path: str):
-    """Serve static files with no caching"""
-    file_location = os.path.join(BASE_DIR, "static", file_path)
-    
-    if not os.path.exists(file_location):
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    # Get file content
-    with open(file_location, "rb") as file:
-        content = file.read()
-    
-    # Determine content type
-    if file_path.endswith(".css"):
-        content_type = "text/css"
-    elif file_path.endswith(".js"):
-        content_type = "application/javascript"
-    elif file_path.endswith(".html"):
-        content_type = "text/html"
-    else:
-        content_type = "application/octet-stream"
-    
-    # Return response with no caching headers
-    return Response(
-        content=content,
-        media_type=content_type,
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
-    )
+async def serve_static(file_path: str, request: Request):
+    """Serve static files from the in-memory asset cache"""
+    return await serve_asset(request, file_path)
 
 # Serve landing page for all non-API routes
 @app.get("/{full_path:path}")
-async def serve_landing(full_path: str):
+async def serve_landing(full_path: str, request: Request):
     """Serve landing page for all non-API routes"""
-    # Skip API routes
-    if full_path.startswith("api/"):
+    # Skip API and track routes
+    if full_path.startswith(("api/", "tracks/")):
         raise HTTPException(status_code=404, detail="Not found")
     
-    # Serve index.html with no caching
-    with open(os.path.join(BASE_DIR, "static/index.html"), "r", encoding="utf-8") as file:
-        content = file.read()
-    
-    return Response(
-        content=content,
-        media_type="text/html",
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
-    )
+    return await serve_asset(request, "index.html")
 
 if __name__ == "__main__":
     import uvicorn
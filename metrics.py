@@ -0,0 +1,366 @@
+"""
+Prometheus-style metrics
+Counters, gauges and histograms kept in process memory, rendered in the Prometheus
+text format, plus an ASGI middleware that times every request by its route template.
+Worker processes started by serve.py share a directory of snapshots so one scrape
+sees the totals of all of them
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends "; charset=utf-8"
+SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK")
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Sequence[float]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self.labels()  # unlabelled metrics are exported as 0 from the start
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        return _Value()
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "children": [[list(key), child.value] for key, child in self._children.items()],
+        }
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """`merge` decides what a multi-process scrape shows: "sum" over live
+    workers, or "local" for values every worker computes the same way"""
+
+    type = "gauge"
+
+    def __init__(self, *args, merge: str = "sum", **kwargs):
+        self.merge = merge
+        self._function: Optional[Callable[[], float]] = None
+        super().__init__(*args, **kwargs)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value at scrape time instead of tracking it"""
+        self._function = function
+
+    def snapshot(self) -> dict:
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logger.warning(f"Metric {self.name} callback failed: {e}")
+        data = super().snapshot()
+        data["merge"] = self.merge
+        return data
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(*args, **kwargs)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "buckets": list(self.upper_bounds),
+            "children": [[list(key), {"counts": child.counts, "sum": child.sum}] for key, child in self._children.items()],
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def render(self, others: Iterable[Dict[str, dict]] = ()) -> str:
+        """Text exposition of this process's metrics merged with snapshots of other workers"""
+        merged = self.snapshot()
+        for snapshot in others:
+            merge_snapshot(merged, snapshot)
+        lines: List[str] = []
+        for name, data in merged.items():
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['type']}")
+            labelnames = data["labelnames"]
+            for key, value in data["children"]:
+                labels = list(zip(labelnames, key))
+                if data["type"] == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(data["buckets"] + ["+Inf"], value["counts"]):
+                        cumulative += count
+                        le = bound if isinstance(bound, str) else format_float(bound)
+                        lines.append(f"{name}_bucket{format_labels(labels + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_float(value['sum'])}")
+                    lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{format_labels(labels)} {format_float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def merge_snapshot(into: Dict[str, dict], snapshot: Dict[str, dict]):
+    for name, data in snapshot.items():
+        target = into.get(name)
+        if target is None or target["type"] != data["type"] or target.get("merge") == "local":
+            continue
+        children = {tuple(key): value for key, value in target["children"]}
+        for key, value in data["children"]:
+            key = tuple(key)
+            current = children.get(key)
+            if data["type"] == "histogram":
+                if current is None:
+                    children[key] = {"counts": list(value["counts"]), "sum": value["sum"]}
+                elif len(current["counts"]) == len(value["counts"]):
+                    current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                    current["sum"] += value["sum"]
+            else:
+                children[key] = (current or 0.0) + value
+        target["children"] = [[list(key), value] for key, value in children.items()]
+
+
+def format_float(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MultiProcessSnapshots:
+    """Each worker writes its snapshot to `<directory>/<pid>.json` every `interval`
+    seconds; a scrape merges its own live values with the other workers' files.
+    Counters and histograms of exited workers keep counting, their gauges do not."""
+
+    def __init__(self, registry: Registry, directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.pid = os.getpid()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self):
+        path = os.path.join(self.directory, f"{self.pid}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"pid": self.pid, "written_at": time.time(), "metrics": self.registry.snapshot()}, file)
+        os.replace(tmp_path, path)
+
+    def others(self) -> List[Dict[str, dict]]:
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if data.get("pid") == self.pid:
+                continue
+            metrics = data.get("metrics", {})
+            if not pid_alive(data.get("pid")):
+                metrics = {name: value for name, value in metrics.items() if value["type"] != "gauge"}
+            snapshots.append(metrics)
+        return snapshots
+
+    async def run(self):
+        import asyncio
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request count, latency histogram and in-flight gauge,
+    labelled by route template (`/api/leads/{lead_id}`) rather than raw path so
+    label cardinality stays bounded."""
+
+    def __init__(self, app, requests_total: Counter, request_duration: Histogram, in_progress: Gauge):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_duration = request_duration
+        self.in_progress = in_progress
+        self._route_paths: Optional[Dict[object, str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        self.in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_progress.dec()
+            route = self._route_template(scope)
+            method = scope["method"]
+            self.request_duration.labels(method, route).observe(time.perf_counter() - started)
+            self.requests_total.labels(method, route, status_code).inc()
+
+    def _route_template(self, scope) -> str:
+        routes = getattr(scope.get("app"), "routes", ())
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            if self._route_paths is None:
+                self._route_paths = {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")}
+            path = self._route_paths.get(endpoint)
+            if path is not None:
+                return path
+        # Answered before routing (e.g. a 429 from the rate limiter): match it here
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+
+def sql_operation(statement: str) -> str:
+    """Leading keyword of a statement, "OTHER" for anything unusual (bounded label values)"""
+    words = statement.lstrip()[:10].split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine, queries_total: Counter, query_duration: Histogram, query_errors: Counter):
+    """Count and time every statement a (sync) SQLAlchemy engine executes.
+
+    For an AsyncEngine pass `async_engine.sync_engine`: the cursor events fire in
+    the driver's thread bridge with the same execution context.
+    """
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        operation = sql_operation(statement)
+        queries_total.labels(operation).inc()
+        query_duration.labels(operation).observe(time.perf_counter() - started)
+
+    def handle_error(exception_context):
+        statement = exception_context.statement or ""
+        query_errors.labels(sql_operation(statement)).inc()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
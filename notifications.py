@@ -0,0 +1,202 @@
+"""
+Telegram notification dispatcher
+Queues admin notifications, coalesces bursts into digests and respects Telegram rate limits
+"""
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class TelegramDispatcher:
+    """Single consumer queue in front of Telegram's sendMessage.
+
+    Messages for one chat are sent at most once per `min_interval` seconds.
+    Everything that piles up while waiting is merged into one digest message,
+    so a burst of N leads costs a handful of API calls instead of N.
+    429 responses are retried after Telegram's `retry_after`, network errors
+    and 5xx with exponential backoff; a digest Telegram rejects (4xx) is resent
+    item by item, so one bad notification does not drop the rest. `on_delivered` receives the ids of the
+    items that made it to the chat, `on_send` the duration and outcome of
+    every sendMessage call (for metrics).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        api_url: str,
+        chat_id: str,
+        min_interval: float = 1.0,
+        max_batch: int = 20,
+        max_retries: int = 5,
+        on_delivered: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+        on_send: Optional[Callable[[float, str], None]] = None,
+    ):
+        self.client = client
+        self.api_url = api_url
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.on_delivered = on_delivered
+        self.on_send = on_send
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sent = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what is queued (bounded by `timeout`) and stop the worker"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} queued telegram notifications on shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def enqueue(self, item_id: int, text: str):
+        self.queue.put_nowait((item_id, text))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            wait = self._last_sent + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Error dispatching telegram notifications: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _deliver(self, batch: List[Tuple[int, str]]):
+        texts = dict(batch)
+        delivered = []
+        for ids, text in build_messages(batch):
+            outcome = await self._send(text)
+            if outcome == "rejected" and len(ids) > 1:
+                # One notification Telegram cannot parse must not sink the whole digest
+                logger.warning(f"Telegram rejected a digest of {len(ids)} notifications, sending them one by one")
+                for item_id in ids:
+                    if await self._send(texts[item_id]) == "ok":
+                        delivered.append(item_id)
+                    else:
+                        logger.error(f"Giving up on telegram notification for {[item_id]}")
+            elif outcome == "ok":
+                delivered.extend(ids)
+            else:
+                logger.error(f"Giving up on telegram notification for {ids}")
+        if delivered and self.on_delivered:
+            await self.on_delivered(delivered)
+
+    async def _send(self, text: str) -> str:
+        """sendMessage with retries; returns the outcome of the last attempt (see send_outcome)"""
+        loop = asyncio.get_running_loop()
+        outcome = "network_error"
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_sent + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            started = loop.time()
+            try:
+                response = await self.client.post(
+                    f"{self.api_url}/sendMessage",
+                    json={"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"},
+                )
+            except httpx.HTTPError as e:
+                outcome = "network_error"
+                self._record_send(loop.time() - started, outcome)
+                logger.warning(f"Telegram request failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            finally:
+                self._last_sent = loop.time()
+
+            outcome = send_outcome(response.status_code)
+            self._record_send(self._last_sent - started, outcome)
+            if response.status_code == 200:
+                return outcome
+            if response.status_code == 429:
+                retry_after = retry_after_seconds(response)
+                logger.warning(f"Telegram rate limit hit, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            if response.status_code >= 500:
+                logger.warning(f"Telegram returned {response.status_code} (attempt {attempt + 1})")
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            logger.error(f"Failed to send telegram notification: {response.text}")
+            return outcome
+        return outcome
+
+    def _record_send(self, duration: float, outcome: str):
+        if self.on_send:
+            try:
+                self.on_send(duration, outcome)
+            except Exception as e:
+                logger.debug(f"on_send callback failed: {e}")
+
+
+def build_messages(batch: List[Tuple[int, str]]) -> List[Tuple[List[int], str]]:
+    """Merge queued notifications into as few messages as fit Telegram's size limit"""
+    if len(batch) == 1:
+        item_id, text = batch[0]
+        return [([item_id], text)]
+
+    messages = []
+    ids, parts, size = [], [], 0
+    for item_id, text in batch:
+        if parts and size + len(text) > TELEGRAM_MESSAGE_LIMIT - 100:
+            messages.append((ids, parts))
+            ids, parts, size = [], [], 0
+        ids.append(item_id)
+        parts.append(text.strip())
+        size += len(text) + 2
+    messages.append((ids, parts))
+
+    return [
+        (ids, f"📦 <b>Новых заявок: {len(ids)}</b>\n\n" + "\n\n➖➖➖\n\n".join(parts))
+        for ids, parts in messages
+    ]
+
+
+def send_outcome(status_code: int) -> str:
+    if status_code == 200:
+        return "ok"
+    if status_code == 429:
+        return "rate_limited"
+    if status_code >= 500:
+        return "server_error"
+    return "rejected"
+
+
+def retry_after_seconds(response: httpx.Response) -> float:
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
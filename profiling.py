@@ -0,0 +1,194 @@
+"""
+Opt-in request profiling and slow-query log
+Samples requests through cProfile, splits their time into database and everything else,
+and records SQL statements slower than a threshold. Both can be switched at runtime
+"""
+import contextvars
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 2000
+PLACEHOLDER_RUN = re.compile(r"(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)){4,}")
+
+# DB time of the request being profiled; cursor events of its queries add to it
+_request_db = contextvars.ContextVar("profiling_request_db", default=None)
+
+
+def compact_sql(statement: str) -> str:
+    """Collapse long placeholder lists (expanded IN clauses, multi-row VALUES) and truncate"""
+    statement = PLACEHOLDER_RUN.sub(lambda m: f"?, ... ({m.group(0).count(',') + 1} params)", " ".join(statement.split()))
+    if len(statement) > MAX_SQL_LENGTH:
+        statement = statement[:MAX_SQL_LENGTH] + " ..."
+    return statement
+
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """Types of the bound parameters, never their values (leads carry personal data)"""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {parameters_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if len(parameters) > 10 and len({type(value) for value in parameters}) == 1:
+            return f"({len(parameters)} x {type(parameters[0]).__name__})"
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """Statements slower than `threshold` seconds, newest last, at most `maxlen` kept"""
+
+    def __init__(self, threshold: float = 0.1, maxlen: int = 200, enabled: bool = False):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.entries: Deque[dict] = deque(maxlen=maxlen)
+        self.total = 0
+
+    def record(self, statement: str, parameters, executemany: bool, duration: float):
+        entry = {
+            "at": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            "sql": compact_sql(statement),
+            "parameters": parameters_shape(parameters, executemany),
+        }
+        self.entries.append(entry)
+        self.total += 1
+        logger.warning(f"Slow query ({entry['duration_ms']} ms): {entry['sql']} {entry['parameters']}")
+
+    def clear(self):
+        self.entries.clear()
+        self.total = 0
+
+
+class RequestProfiler:
+    """Aggregated cProfile stats of a random `sample_rate` share of requests.
+
+    Only one request is profiled at a time (cProfile hooks the whole thread), and
+    whatever else the event loop runs while it awaits is included in its profile,
+    which is the point when looking for what is slow during a spike.
+    """
+
+    def __init__(self, sample_rate: float = 0.01, max_samples: int = 200, enabled: bool = False):
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self.samples: Deque[dict] = deque(maxlen=max_samples)
+        self.profiled = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._busy = False
+
+    def should_sample(self) -> bool:
+        return self.enabled and not self._busy and random.random() < self.sample_rate
+
+    def begin(self) -> cProfile.Profile:
+        self._busy = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile: cProfile.Profile, sample: dict):
+        profile.disable()
+        self._busy = False
+        profile.create_stats()
+        if self._stats is None:
+            self._stats = pstats.Stats(profile)
+        else:
+            self._stats.add(profile)
+        self.samples.append(sample)
+        self.profiled += 1
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> str:
+        if self._stats is None:
+            return "No requests profiled yet\n"
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.add(self._stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self) -> bytes:
+        """Raw pstats data (the format of `cProfile -o`), for snakeviz or pstats.Stats(path)"""
+        return marshal.dumps(self._stats.stats) if self._stats is not None else marshal.dumps({})
+
+    def clear(self):
+        self._stats = None
+        self.samples.clear()
+        self.profiled = 0
+
+
+def instrument_engine(engine, slow_queries: SlowQueryLog):
+    """Feed a (sync) SQLAlchemy engine's statements into the slow-query log and the
+    DB time of the request being profiled. Costs one attribute check when both are off."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and (slow_queries.enabled or _request_db.get() is not None):
+            context._profiling_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiling_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        request_db = _request_db.get()
+        if request_db is not None:
+            request_db[0] += duration
+            request_db[1] += 1
+        if slow_queries.enabled and duration >= slow_queries.threshold:
+            slow_queries.record(statement, parameters, executemany, duration)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware running sampled requests under the profiler and
+    recording their total time, time spent in SQL and query count"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        request_db: List[float] = [0.0, 0]
+        token = _request_db.set(request_db)
+        started = time.perf_counter()
+        profile = self.profiler.begin()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            total = time.perf_counter() - started
+            _request_db.reset(token)
+            self.profiler.end(profile, {
+                "at": time.time(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "total_ms": round(total * 1000, 3),
+                "db_ms": round(request_db[0] * 1000, 3),
+                "db_queries": request_db[1],
+                "other_ms": round((total - request_db[0]) * 1000, 3),
+            })
@@ -0,0 +1,238 @@
+"""
+Token-bucket rate limiting for public endpoints
+ASGI middleware that throttles per client IP and per subnet before the request body
+is read, with an in-process bucket store or a shared Redis one for several workers
+"""
+import ipaddress
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is only needed for RATE_LIMIT_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+LIMIT_PATTERN = re.compile(r"^(\d+)\s*/\s*(\d*)\s*([a-z]+)\s+(ip|subnet)$")
+
+# Same arithmetic as take_token(), run atomically inside Redis
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def take_token(tokens: Optional[float], updated_at: Optional[float], now: float,
+               rate: float, capacity: float, cost: float = 1.0) -> Tuple[float, bool, float]:
+    """Refill a bucket up to `now` and try to take `cost` from it: (tokens, allowed, retry_after)"""
+    if tokens is None:
+        tokens, updated_at = capacity, now
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens per second
+    capacity: float  # burst size
+    scope: str  # "ip" or "subnet"
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    method: str
+    path: str  # exact path, or a prefix when it ends with "*"
+    limits: Tuple[Limit, ...]
+
+    def matches(self, method: str, path: str) -> bool:
+        if method != self.method:
+            return False
+        if self.path.endswith("*"):
+            return path.startswith(self.path[:-1])
+        return path == self.path
+
+
+def parse_rules(spec: str) -> List[RateLimitRule]:
+    """Parse "POST /api/leads: 5/minute ip, 30/minute subnet; POST /api/generate: 3/10min ip"
+
+    Each limit is a bucket of N tokens refilled at N per period.
+    """
+    rules = []
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        route, _, limits_spec = entry.partition(":")
+        try:
+            method, path = route.split()
+        except ValueError:
+            raise ValueError(f"Invalid rate limit route: {route!r}")
+        limits = []
+        for limit_spec in filter(None, (part.strip() for part in limits_spec.split(","))):
+            match = LIMIT_PATTERN.match(limit_spec.lower())
+            if not match or match.group(3) not in PERIODS:
+                raise ValueError(f"Invalid rate limit: {limit_spec!r}")
+            count, multiplier, unit, scope = match.groups()
+            period = int(multiplier or 1) * PERIODS[unit]
+            limits.append(Limit(rate=int(count) / period, capacity=float(count), scope=scope))
+        rules.append(RateLimitRule(method.upper(), path, tuple(limits)))
+    return rules
+
+
+class MemoryRateLimitStore:
+    """Buckets in this process only (one uvicorn worker), bounded LRU"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (None, None))
+        tokens, allowed, retry_after = take_token(tokens, updated_at, now, rate, capacity, cost)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    async def aclose(self):
+        pass
+
+
+class RedisRateLimitStore:
+    """Buckets shared by every worker/host through one Redis, updated by a Lua script"""
+
+    def __init__(self, url: str, prefix: str = "rl:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the 'redis' package")
+        self.prefix = prefix
+        self.client = redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(keys=[self.prefix + key], args=[rate, capacity, time.time(), cost])
+        return bool(int(allowed)), float(retry_after)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def client_subnet(ip: str, ipv4_prefix: int = 24, ipv6_prefix: int = 64) -> str:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = ipv4_prefix if address.version == 4 else ipv6_prefix
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware: matching requests spend one token from each of their
+    rule's buckets and get a 429 with Retry-After as soon as one is empty.
+
+    Nothing is read from the request except method, path and client address, so
+    rejected floods never reach body parsing, the database or Telegram. If the
+    store fails, requests are let through (fail open) and the error is logged.
+    """
+
+    def __init__(self, app, store, rules: Sequence[RateLimitRule], exempt: Sequence[str] = (),
+                 ipv4_prefix: int = 24, ipv6_prefix: int = 64):
+        self.app = app
+        self.store = store
+        self.rules = list(rules)
+        self.exempt = [ipaddress.ip_network(network, strict=False) for network in exempt]
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        self.rejected = 0
+        self._last_error_log = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self._match(scope["method"], scope["path"])
+        client = scope.get("client")
+        if rule is None or client is None or self._is_exempt(client[0]):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await self._take(rule, client[0])
+        if retry_after is None:
+            await self.app(scope, receive, send)
+            return
+        self.rejected += 1
+        await self._reject(send, retry_after)
+
+    def _match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def _is_exempt(self, ip: str) -> bool:
+        if not self.exempt:
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.exempt)
+
+    async def _take(self, rule: RateLimitRule, ip: str) -> Optional[float]:
+        """None if the request may pass, else seconds until it would"""
+        identities: Dict[str, str] = {"ip": ip}
+        retry_after = None
+        for limit in rule.limits:
+            if limit.scope not in identities:
+                identities[limit.scope] = client_subnet(ip, self.ipv4_prefix, self.ipv6_prefix)
+            key = f"{rule.method} {rule.path}|{limit.scope}|{identities[limit.scope]}"
+            try:
+                allowed, wait = await self.store.take(key, limit.rate, limit.capacity)
+            except Exception as e:
+                now = time.monotonic()
+                if now - self._last_error_log > 60:
+                    self._last_error_log = now
+                    logger.error(f"Rate limit store unavailable, letting requests through: {e}")
+                return None
+            if not allowed:
+                retry_after = max(retry_after or 0.0, wait)
+        return retry_after
+
+    @staticmethod
+    async def _reject(send, retry_after: float):
+        body = json.dumps({"detail": "Too many requests, try again later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
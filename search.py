@@ -0,0 +1,118 @@
+"""
+Full-text search over leads
+SQLite FTS5 index on name, email, phone, message and text description, kept in sync
+with the leads table by triggers, and the builder for its MATCH expressions
+"""
+import logging
+import re
+from typing import Optional
+
+from contacts import phone_prefixes
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "leads_fts"
+# Indexed leads columns; the normalized phone so "+7 (999) 123-45-67" and "89991234567" find the same lead
+FTS_COLUMNS = ("name", "email", "phone_normalized", "message", "text_description")
+# bm25() weight per column: a hit in the name or contacts counts more than one in free text
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0, 1.0)
+MAX_TERMS = 8
+
+PHONE_RUN = re.compile(r"\+?\d[\d\s()\-]{4,}\d")
+TOKEN = re.compile(r"[^\W_]+")
+
+_columns = ", ".join(FTS_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in FTS_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in FTS_COLUMNS)
+
+# External content table: the index stores only tokens, the rows stay in `leads`
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_columns}, content='leads', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+TRIGGERS = {
+    f"{FTS_TABLE}_ai": (
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON leads BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END"
+    ),
+    f"{FTS_TABLE}_ad": (
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON leads BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); END"
+    ),
+    f"{FTS_TABLE}_au": (
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON leads BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END"
+    ),
+}
+
+
+def fts_query(text: str) -> Optional[str]:
+    """MATCH expression for what an admin typed into a search box, or None if it has no terms.
+
+    Every whitespace-separated word becomes a quoted phrase of its tokens (so
+    "ivan@mail.ru" stays one phrase) and the words are ANDed; the last one is
+    matched as a prefix, for search-as-you-type. Phone numbers are normalized
+    like stored ones and always matched as prefixes, with and without the
+    country code (see phone_prefixes). Nothing the user types is passed
+    through as FTS5 syntax.
+    """
+    phones = {}
+
+    def phone_term(match):
+        prefixes = phone_prefixes(match.group(0))
+        term = " OR ".join(f'"{prefix}"*' for prefix in prefixes)
+        phones[prefixes[0]] = f"({term})" if len(prefixes) > 1 else term
+        return f" {prefixes[0]} "
+
+    terms = []
+    for word in PHONE_RUN.sub(phone_term, text).split():
+        if word in phones:
+            terms.append((phones[word], False))
+            continue
+        tokens = TOKEN.findall(word.lower())
+        if tokens:
+            terms.append(('"' + " ".join(tokens) + '"', True))
+    if not terms:
+        return None
+    terms = terms[:MAX_TERMS]
+    last, open_ended = terms[-1]
+    if open_ended and len(last) > 3:  # a one-letter prefix would expand to most of the vocabulary
+        terms[-1] = (last + "*", False)
+    return " ".join(term for term, _ in terms)
+
+
+def bm25_expression() -> str:
+    return f"bm25({FTS_TABLE}, {', '.join(str(weight) for weight in FTS_WEIGHTS)})"
+
+
+def rebuild_search_index(bind):
+    """Re-tokenize every lead, e.g. after rows were written with the triggers dropped"""
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    logger.info(f"Rebuilt {FTS_TABLE}")
+
+
+def create_search_index(bind):
+    """Create the FTS table and its triggers (SQLite only).
+
+    The index is rebuilt whenever a trigger had to be (re)created: until then
+    writes to leads were not mirrored into it.
+    """
+    with bind.begin() as conn:
+        existing = {row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'leads'"
+        )}
+        conn.exec_driver_sql(CREATE_TABLE)
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            conn.exec_driver_sql(TRIGGERS[name])
+    if missing:
+        rebuild_search_index(bind)
+
+
+def drop_search_triggers(conn):
+    """Stop mirroring writes into the index during a bulk load through a sqlite3
+    connection; run_migrations() restores the triggers and rebuilds the index"""
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
@@ -0,0 +1,80 @@
+"""
+Production entry point
+Applies schema migrations once, then starts uvicorn with several worker processes
+(uvloop + httptools when installed) that skip migrations themselves and share
+their /metrics through METRICS_MULTIPROC_DIR
+
+Usage:
+    WEB_CONCURRENCY=4 RATE_LIMIT_BACKEND=redis python serve.py
+"""
+import glob
+import importlib.util
+import logging
+import os
+import tempfile
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))  # seconds for running requests
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "lending-metrics"))
+
+logger = logging.getLogger("serve")
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def migrate():
+    """Run migrations in this (parent) process only"""
+    from main import engine, run_migrations
+
+    run_migrations(engine)
+    engine.dispose()
+
+
+def prepare_metrics_dir():
+    """Start every run with an empty snapshot directory: old counters must not add up"""
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, "*.json*")):
+        os.remove(path)
+    os.environ["METRICS_MULTIPROC_DIR"] = METRICS_MULTIPROC_DIR
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    # main.py reads its settings on import, and with one worker uvicorn serves the
+    # module migrate() already imported: the workers' environment is set up first
+    os.environ["AUTO_MIGRATE"] = "false"
+    prepare_metrics_dir()
+    migrate()
+
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    if WEB_CONCURRENCY > 1 and os.getenv("RATE_LIMIT_BACKEND", "memory") == "memory":
+        logger.warning(
+            f"{WEB_CONCURRENCY} workers with RATE_LIMIT_BACKEND=memory: every worker keeps its own buckets, "
+            f"so clients get {WEB_CONCURRENCY}x the configured rate limits"
+        )
+    logger.info(f"Starting {WEB_CONCURRENCY} workers on {HOST}:{PORT} (loop={loop}, http={http})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        log_level=LOG_LEVEL,
+    )
+
+
+if __name__ == "__main__":
+    main()
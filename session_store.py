@@ -0,0 +1,157 @@
+"""
+Admin session storage
+Expiring login tokens kept in process memory or in a database table shared by every
+uvicorn worker, with a background task that sweeps out expired sessions
+"""
+import asyncio
+import hashlib
+import heapq
+import logging
+import secrets
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+
+logger = logging.getLogger(__name__)
+
+
+def hash_token(token: str) -> str:
+    """Sessions are stored under the token's SHA-256, never the token itself"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionStore(ABC):
+    """Interface of the session backends.
+
+    `create()` returns a new random token valid for `ttl` seconds, `get()`
+    returns its session dict or None once it is unknown or expired.
+    """
+
+    def __init__(self, ttl: float = 86400.0, sweep_interval: float = 300.0):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def create(self) -> str:
+        """Start a session and return its token"""
+
+    @abstractmethod
+    async def get(self, token: str) -> Optional[dict]:
+        """The session behind `token`, None if unknown or expired"""
+
+    @abstractmethod
+    async def delete(self, token: str):
+        """End the session; unknown tokens are ignored"""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Drop expired sessions, return how many were removed"""
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Swept {removed} expired admin sessions")
+            except Exception as e:
+                logger.warning(f"Admin session sweep failed: {e}")
+
+    async def aclose(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def _new_session(self) -> Tuple[str, dict]:
+        now = datetime.utcnow()
+        return secrets.token_urlsafe(32), {"created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process store: dict lookups, expiry order kept in a heap so a sweep
+    only touches sessions that actually expired"""
+
+    def __init__(self, ttl: float = 86400.0, sweep_interval: float = 300.0):
+        super().__init__(ttl, sweep_interval)
+        self._sessions: Dict[str, dict] = {}
+        self._expiry: List[Tuple[datetime, str]] = []
+
+    async def create(self) -> str:
+        token, session = self._new_session()
+        key = hash_token(token)
+        self._sessions[key] = session
+        heapq.heappush(self._expiry, (session["expires_at"], key))
+        return token
+
+    async def get(self, token: str) -> Optional[dict]:
+        key = hash_token(token)
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if session["expires_at"] <= datetime.utcnow():
+            del self._sessions[key]
+            return None
+        return session
+
+    async def delete(self, token: str):
+        self._sessions.pop(hash_token(token), None)
+
+    async def sweep(self) -> int:
+        now = datetime.utcnow()
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            session = self._sessions.get(key)
+            if session is not None and session["expires_at"] == expires_at:
+                del self._sessions[key]
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class DatabaseSessionStore(SessionStore):
+    """Shared store on a table with `token_hash` (primary key), `created_at` and
+    an indexed `expires_at`, so every worker sees the same logins"""
+
+    def __init__(self, session_factory, model, ttl: float = 86400.0, sweep_interval: float = 300.0):
+        super().__init__(ttl, sweep_interval)
+        self.session_factory = session_factory
+        self.model = model
+
+    async def create(self) -> str:
+        token, session = self._new_session()
+        async with self.session_factory() as db:
+            db.add(self.model(token_hash=hash_token(token), **session))
+            await db.commit()
+        return token
+
+    async def get(self, token: str) -> Optional[dict]:
+        async with self.session_factory() as db:
+            row = await db.get(self.model, hash_token(token))
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return {"created_at": row.created_at, "expires_at": row.expires_at}
+
+    async def delete(self, token: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(self.model).where(self.model.token_hash == hash_token(token)))
+            await db.commit()
+
+    async def sweep(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(delete(self.model).where(self.model.expires_at <= datetime.utcnow()))
+            await db.commit()
+        return result.rowcount
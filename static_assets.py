@@ -0,0 +1,209 @@
+"""
+In-memory static asset cache
+Keeps file bytes plus precompressed gzip/brotli variants keyed by mtime, answers
+conditional requests with 304 and rewrites HTML references to content-hashed URLs.
+Files are compressed hard once at startup; anything (re)loaded while serving is read
+and compressed in a worker thread at cheaper settings
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+STATIC_REF_PATTERN = re.compile(r"""(["'])/static/([^"'?#]+)(?:\?[^"'#]*)?\1""")
+# (gzip level, brotli quality): maximum for preload(), cheap for files loaded on a request.
+# Brotli 11 takes ~100 ms on the 44 KB style.css, level 5 under 2 ms for ~15% larger output
+PRELOAD_COMPRESSION = (9, 11)
+ON_REQUEST_COMPRESSION = (6, 5)
+
+
+@dataclass
+class StaticAsset:
+    path: str
+    mtime_ns: int
+    size: int
+    content_type: str
+    digest: str
+    body: bytes
+    gzip_body: Optional[bytes] = None
+    br_body: Optional[bytes] = None
+    deps: Dict[str, str] = field(default_factory=dict)  # html only: referenced asset -> digest
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+
+class StaticAssetCache:
+    """Serves files under `root` from memory.
+
+    Files are re-read only when their mtime or size changes (checked at most
+    every `check_interval` seconds). HTML files get their /static/... links
+    rewritten to `?v=<content hash>` URLs, which are then served with a
+    one-year immutable Cache-Control; everything else must revalidate
+    with its ETag.
+
+    `get()` does blocking file I/O and compression; request handlers use
+    `aget()`, which answers from memory and runs `get()` in the threadpool
+    only when a file is due for a check.
+    """
+
+    def __init__(self, root: str, check_interval: float = 1.0, compress_min_size: int = 512):
+        self.root = os.path.realpath(root)
+        self.check_interval = check_interval
+        self.compress_min_size = compress_min_size
+        self._assets: Dict[str, StaticAsset] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    def resolve(self, rel_path: str) -> Optional[str]:
+        """Absolute path of `rel_path` inside root, None for anything outside it"""
+        full_path = os.path.realpath(os.path.join(self.root, rel_path))
+        if not full_path.startswith(self.root + os.sep):
+            return None
+        return full_path
+
+    def preload(self) -> int:
+        """Load and compress every file under root at the highest settings; returns the count"""
+        count = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                rel_path = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if self.get(rel_path, PRELOAD_COMPRESSION) is not None:
+                    count += 1
+        return count
+
+    def _cached(self, rel_path: str, now: float) -> Optional[StaticAsset]:
+        asset = self._assets.get(rel_path)
+        if asset is not None and now - self._checked_at.get(rel_path, 0) < self.check_interval:
+            return asset
+        return None
+
+    async def aget(self, rel_path: str) -> Optional[StaticAsset]:
+        asset = self._cached(rel_path, time.monotonic())
+        if asset is not None:
+            return asset
+        return await run_in_threadpool(self.get, rel_path)
+
+    def get(self, rel_path: str, compression: tuple = ON_REQUEST_COMPRESSION) -> Optional[StaticAsset]:
+        now = time.monotonic()
+        asset = self._cached(rel_path, now)
+        if asset is not None:
+            return asset
+        asset = self._assets.get(rel_path)
+
+        full_path = self.resolve(rel_path)
+        if full_path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            self._assets.pop(rel_path, None)
+            return None
+        if not os.path.isfile(full_path):
+            return None
+
+        self._checked_at[rel_path] = now
+        if asset is not None and asset.mtime_ns == stat.st_mtime_ns and asset.size == stat.st_size and self._deps_fresh(asset):
+            return asset
+
+        asset = self._load(rel_path, full_path, stat, compression)
+        self._assets[rel_path] = asset
+        return asset
+
+    def _deps_fresh(self, asset: StaticAsset) -> bool:
+        for dep, digest in asset.deps.items():
+            current = self.get(dep)
+            if current is None or current.digest != digest:
+                return False
+        return True
+
+    def _load(self, rel_path: str, full_path: str, stat, compression: tuple) -> StaticAsset:
+        with open(full_path, "rb") as file:
+            body = file.read()
+
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if content_type == "application/javascript":
+            content_type += "; charset=utf-8"  # text/* get their charset from Response
+
+        deps = {}
+        if content_type.startswith("text/html"):
+            body, deps = self._rewrite_html(body, compression)
+
+        asset = StaticAsset(
+            path=rel_path,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            content_type=content_type,
+            digest=hashlib.sha256(body).hexdigest()[:16],
+            body=body,
+            deps=deps,
+        )
+        if len(body) >= self.compress_min_size and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzip_level, brotli_quality = compression
+            asset.gzip_body = gzip.compress(body, compresslevel=gzip_level, mtime=0)
+            if brotli is not None:
+                asset.br_body = brotli.compress(body, quality=brotli_quality)
+        logger.info(f"Loaded static asset {rel_path} ({len(body)} bytes)")
+        return asset
+
+    def _rewrite_html(self, body: bytes, compression: tuple):
+        deps = {}
+        text = body.decode("utf-8")
+
+        def replace(match):
+            quote, path = match.group(1), match.group(2)
+            asset = self.get(path, compression) if not path.endswith(".html") else None
+            if asset is None:
+                return match.group(0)
+            deps[path] = asset.digest
+            return f"{quote}/static/{path}?v={asset.digest}{quote}"
+
+        return STATIC_REF_PATTERN.sub(replace, text).encode("utf-8"), deps
+
+    def hashed_url(self, rel_path: str) -> str:
+        asset = self.get(rel_path)
+        return f"/static/{rel_path}?v={asset.digest}" if asset else f"/static/{rel_path}"
+
+    def response(self, request: Request, asset: StaticAsset) -> Response:
+        """Build the best response for `asset`: 304, brotli, gzip or identity"""
+        accept_encoding = request.headers.get("accept-encoding", "")
+        encoding, body = None, asset.body
+        if asset.br_body is not None and "br" in accept_encoding:
+            encoding, body = "br", asset.br_body
+        elif asset.gzip_body is not None and "gzip" in accept_encoding:
+            encoding, body = "gzip", asset.gzip_body
+
+        versioned = request.query_params.get("v") == asset.digest
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or any(
+            tag.strip().removeprefix("W/") in (asset.etag(encoding), asset.etag())
+            for tag in if_none_match.split(",")
+        )):
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.content_type, headers=headers)
@@ -252,6 +252,8 @@ function initDraggableStyles() {
 }
 
 // Form validation and submission
+let leadSubmissionKey = null;
+
 document.getElementById('leadForm')?.addEventListener('submit', async function(e) {
     e.preventDefault();
     
@@ -317,11 +319,19 @@ document.getElementById('leadForm')?.addEventListener('submit', async function(e
         source: 'landing'
     };
     
+    // Same key for retries of this submission, so the backend stores it only once
+    if (!leadSubmissionKey) {
+        leadSubmissionKey = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+    
     try {
         const response = await fetch('/api/leads', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': leadSubmissionKey
             },
             body: JSON.stringify(formData)
         });
@@ -329,6 +339,7 @@ document.getElementById('leadForm')?.addEventListener('submit', async function(e
         const data = await response.json();
         
         if (response.ok) {
+            leadSubmissionKey = null;
             formStatus.className = 'form-status success';
             formStatus.textContent = '✓ Заявка успешно отправлена! Мы свяжемся с вами в ближайшее время.';
             this.reset();
@@ -0,0 +1,119 @@
+"""
+Test configuration
+main.py reads its settings at import time, so the environment is pointed at a
+throwaway database and tracks directory before any test module imports it
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="lending-tests-")
+ADMIN_TOKEN = "test-admin-token"
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIR, 'leads.db')}",
+    "TRACKS_DIR": os.path.join(TEST_DIR, "tracks"),
+    "APP_DIR": os.path.join(ROOT, "templates"),
+    "ADMIN_API_TOKEN": ADMIN_TOKEN,
+    "TELEGRAM_BOT_TOKEN": "",
+    "TELEGRAM_ADMIN_ID": "",
+    "GENERATION_BACKEND": "fake",
+    "TRACK_WORKER_MODE": "external",
+    # The limiter stays in the middleware stack; only a probe route is tight enough to trip it
+    "RATE_LIMIT_ENABLED": "true",
+    "RATE_LIMIT_BACKEND": "memory",
+    "RATE_LIMIT_RULES": "POST /api/leads: 10000/minute ip; POST /rate-limit-probe: 1/hour ip",
+})
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Schema of the test database, created once per run"""
+    import main
+
+    main.run_migrations(main.engine)
+    return main.engine
+
+
+def create_database(path: str, leads: int = 0) -> str:
+    """A migrated SQLite database at `path` with `leads` synthetic leads, newest last.
+
+    Timestamps are written the way SQLAlchemy stores them, and every three
+    consecutive leads share one, to exercise (created_at, id) ordering.
+    """
+    import sqlite3
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import create_engine
+
+    import main
+
+    engine = create_engine(f"sqlite:///{path}")
+    main.run_migrations(engine)
+    engine.dispose()
+    start = datetime(2026, 1, 1)
+    rows = (
+        (f"Lead {n}", f"lead{n}@example.com", f"+7999{n:07d}", "pop", 0, "landing", "new",
+         (start + timedelta(seconds=n // 3)).isoformat(sep=" ", timespec="microseconds"), 1, f"lead{n}@example.com", f"7999{n:07d}")
+        for n in range(leads)
+    )
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO leads (name, email, phone, style, has_text, source, status, created_at, telegram_sent, "
+            "email_normalized, phone_normalized) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return path
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def start_server(tmp_path):
+    """Start `uvicorn main:app` in a subprocess on a database file; returns its base URL"""
+    import subprocess
+    import time
+
+    import httpx
+
+    processes = []
+
+    def start(db_path: str, **env) -> str:
+        port = free_port()
+        log = open(tmp_path / f"server-{port}.log", "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "TRACKS_DIR": str(tmp_path / "tracks"),
+                 "RATE_LIMIT_ENABLED": "false", **env},
+        )
+        processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{url}/readyz", timeout=1.0).status_code == 200:
+                    return url
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"server did not start, see {log.name}")
+            time.sleep(0.1)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
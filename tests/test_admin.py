@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+
+import pytest
+
+import admin
+
+
+@pytest.fixture
+def client(database):
+    admin.app.config["TESTING"] = True
+    client = admin.app.test_client()
+    with client.session_transaction() as session:
+        session["admin_logged_in"] = True
+    return client
+
+
+def test_connections_are_reused_across_request_threads(client, monkeypatch):
+    opened = []
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(admin.sqlite3, "connect", counting_connect)
+    monkeypatch.setattr(admin, "_idle_connections", [])
+
+    def request():
+        assert client.get("/admin").status_code == 200
+
+    for _ in range(6):  # like the development server: a new thread per request
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+
+    assert len(opened) == 1
+    assert admin._idle_connections == opened
+
+
+def test_pool_keeps_at_most_pool_size_idle_connections(database, monkeypatch):
+    monkeypatch.setattr(admin, "_idle_connections", [])
+    monkeypatch.setattr(admin, "DB_POOL_SIZE", 2)
+    contexts = [admin.app.app_context() for _ in range(3)]
+    connections = []
+    for context in contexts:
+        context.push()
+        connections.append(admin.get_db_connection())
+    for context in reversed(contexts):
+        context.pop()
+
+    assert len(set(map(id, connections))) == 3
+    assert len(admin._idle_connections) == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")  # the one that did not fit was closed
+
+
+def test_search_by_partial_local_phone(client, database):
+    with database.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO leads (name, email, phone, style, has_text, email_normalized, phone_normalized, status, created_at) "
+            "VALUES ('Admin Phone', 'admin.phone@example.com', '+7 (916) 555-12-34', 'pop', 0, "
+            "'admin.phone@example.com', '79165551234', 'new', '2026-01-01 10:00:00.000000')"
+        )
+    for q in ("9165551234", "916 555", "8 916 555 12"):
+        assert b"Admin Phone" in client.get("/admin", query_string={"q": q}).data, q
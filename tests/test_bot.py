@@ -0,0 +1,201 @@
+import asyncio
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import bot
+import main
+from conftest import create_database
+
+SECRET = "s3cret"
+ADMIN_ID = "42"
+
+
+def command(text: str, user_id: str = ADMIN_ID) -> dict:
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": text,
+            "chat": {"id": int(user_id), "type": "private"},
+            "from": {"id": int(user_id), "is_bot": False, "first_name": "Admin"},
+        },
+    }
+
+
+class FakeReader:
+    def __init__(self, leads=(), total=0, stats=None):
+        self.calls = []
+        self._leads = list(leads)
+        self._total = total
+        self._stats = stats or {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def leads(self, limit, date_from=None):
+        self.calls.append(("leads", limit, date_from))
+        return self._leads, self._total
+
+    async def stats(self):
+        self.calls.append(("stats",))
+        return self._stats
+
+
+@pytest.fixture(autouse=True)
+def bot_settings(monkeypatch):
+    monkeypatch.setattr(bot, "TELEGRAM_BOT_TOKEN", "123:abc")
+    monkeypatch.setattr(bot, "TELEGRAM_ADMIN_ID", ADMIN_ID)
+    bot.response_cache.clear()
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """main with an embedded (not started) webhook bot; the lifespan isn't run"""
+    webhook_bot = bot.WebhookBot(SECRET, FakeReader())
+    monkeypatch.setattr(main, "webhook_bot", webhook_bot)
+    return webhook_bot, TestClient(main.app)
+
+
+@pytest.mark.parametrize("header, accepted", [
+    (SECRET, True), ("wrong", False), (SECRET + "x", False), ("", False), (None, False),
+])
+def test_verify_compares_the_secret_token(header, accepted):
+    assert bot.WebhookBot(SECRET, FakeReader()).verify(header) is accepted
+
+
+def test_verify_rejects_everything_without_a_secret():
+    webhook_bot = bot.WebhookBot("", FakeReader())
+    assert not webhook_bot.verify("")
+    assert not webhook_bot.verify(None)
+
+
+def test_webhook_is_not_found_when_the_bot_is_not_embedded(monkeypatch):
+    monkeypatch.setattr(main, "webhook_bot", None)
+    response = TestClient(main.app).post(bot.BOT_WEBHOOK_PATH, json=command("/stats"))
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}])
+def test_webhook_rejects_a_missing_or_wrong_secret(webhook, headers):
+    webhook_bot, client = webhook
+    response = client.post(bot.BOT_WEBHOOK_PATH, json=command("/stats"), headers=headers)
+    assert response.status_code == 403
+    assert webhook_bot.application.update_queue.empty()
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+def test_webhook_rejects_an_invalid_update(webhook, body):
+    webhook_bot, client = webhook
+    response = client.post(bot.BOT_WEBHOOK_PATH, content=body, headers={
+        "X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"
+    })
+    assert response.status_code == 400
+    assert webhook_bot.application.update_queue.empty()
+
+
+def test_webhook_queues_the_update(webhook):
+    webhook_bot, client = webhook
+    response = client.post(bot.BOT_WEBHOOK_PATH, json=command("/stats"),
+                           headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert response.status_code == 200
+    update = webhook_bot.application.update_queue.get_nowait()
+    assert update.message.text == "/stats"
+
+
+def fake_update(user_id: str = ADMIN_ID):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=int(user_id)),
+                           message=SimpleNamespace(reply_text=AsyncMock()))
+
+
+def fake_context(reader):
+    return SimpleNamespace(bot_data={"reader": reader})
+
+
+def test_today_reads_from_utc_midnight_through_the_reader():
+    reader = FakeReader(leads=[{"id": 7, "name": "Anna", "phone": "+79990000001", "style": "rock",
+                                "status": "new", "created_at": "2026-01-02T10:00:00"}], total=12)
+    update = fake_update()
+    asyncio.run(bot.today_command(update, fake_context(reader)))
+    (_, limit, date_from), = reader.calls
+    assert limit == bot.LEADS_SHOWN
+    assert date_from == datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    reply = update.message.reply_text.await_args_list[-1].args[0]
+    assert "#7" in reply and "(12 шт.)" in reply and "и еще 2 заявок" in reply
+
+
+def test_commands_ignore_other_users():
+    reader = FakeReader()
+    update = fake_update("7")
+    asyncio.run(bot.stats_command(update, fake_context(reader)))
+    assert reader.calls == []
+    update.message.reply_text.assert_not_awaited()
+
+
+def test_reader_answers_are_cached_and_errors_reported():
+    reader = FakeReader(stats={"total_leads": 1, "new_leads": 1, "today_leads": 1, "total_tracks": 0})
+    for _ in range(2):
+        asyncio.run(bot.stats_command(fake_update(), fake_context(reader)))
+    assert reader.calls == [("stats",)]
+
+    broken = FakeReader()
+    broken.leads = AsyncMock(side_effect=RuntimeError("db is gone"))
+    update = fake_update()
+    asyncio.run(bot.leads_command(update, fake_context(broken)))
+    assert update.message.reply_text.await_args_list[-1].args[0] == "❌ Ошибка соединения с сервером"
+
+
+def test_local_reader_reads_the_database_without_http(tmp_path, monkeypatch):
+    db_path = tmp_path / "leads.db"
+    create_database(db_path, leads=15)
+    with sqlite3.connect(db_path) as conn:  # counters come from the rollup, which create_database skips
+        conn.execute("INSERT INTO lead_daily_stats (day, style, source, status, count) "
+                     "VALUES ('2026-01-01', 'pop', 'landing', 'new', 15)")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    monkeypatch.setattr(main, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setattr(main, "stats_cache", main.StatsCache(0))
+    reader = main.LocalLeadsReader()
+
+    async def read():
+        try:
+            return await reader.leads(bot.LEADS_SHOWN), await reader.stats()
+        finally:
+            await engine.dispose()
+
+    (leads, total), stats = asyncio.run(read())
+    assert total == 15 and stats["total_leads"] == 15
+    assert len(leads) == bot.LEADS_SHOWN
+    ids = [lead["id"] for lead in leads]
+    assert ids == sorted(ids, reverse=True)
+    assert isinstance(leads[0]["created_at"], str)  # same JSON shape as GET /api/leads
+    assert "(15 шт.)" in bot.format_lead_message(leads, "Все заявки", total)
+
+
+def test_api_reader_asks_for_the_shown_leads_and_their_count():
+    seen = []
+
+    def backend(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{"id": 1}], headers={"X-Total-Count": "31"})
+
+    async def read():
+        reader = bot.ApiReader()
+        await reader.start()
+        reader.client._transport = httpx.MockTransport(backend)
+        try:
+            return await reader.leads(bot.LEADS_SHOWN, datetime(2026, 1, 2))
+        finally:
+            await reader.stop()
+
+    assert asyncio.run(read()) == ([{"id": 1}], 31)
+    params = dict(seen[0].url.params)
+    assert seen[0].url.path == "/api/leads"
+    assert params == {"limit": str(bot.LEADS_SHOWN), "count": "true", "date_from": "2026-01-02T00:00:00"}
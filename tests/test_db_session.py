@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from conftest import ADMIN_TOKEN
+
+
+def call(path: str, method: str = "GET", body: bytes = b"") -> dict:
+    """Drive the app with a raw ASGI request and note how many pooled
+    connections are checked out when the response starts going out"""
+    seen = {}
+
+    async def run():
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.sleep(3600)  # the client stays connected
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                seen["status"] = message["status"]
+                seen["checked_out"] = main.async_engine.pool.checkedout()
+
+        path_only, _, query = path.partition("?")
+        await main.app({
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path_only, "raw_path": path_only.encode(), "query_string": query.encode(),
+            "root_path": "", "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {ADMIN_TOKEN}".encode()),
+                        (b"content-type", b"application/json")],
+        }, receive, send)
+        await main.async_engine.dispose()  # the pool is bound to this event loop
+
+    asyncio.run(run())
+    return seen
+
+
+@pytest.mark.parametrize("path", [
+    "/api/leads?limit=5&count=true",
+    "/api/leads/search?q=anna",
+    "/api/stats",
+    "/api/analytics",
+])
+def test_reads_release_the_connection_before_the_response_is_sent(database, path):
+    seen = call(path)
+    assert seen["status"] == 200
+    assert seen["checked_out"] == 0
+
+
+def test_writes_release_the_connection_before_the_response_is_sent(database):
+    body = json.dumps({"prompt": "a song about the sea", "style": "pop"}).encode()
+    seen = call("/api/generate", "POST", body)
+    assert seen["status"] == 200
+    assert seen["checked_out"] == 0
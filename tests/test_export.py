@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import ADMIN_TOKEN, create_database
+
+AUTH = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+def test_export_pages_through_ties_in_order(tmp_path, monkeypatch):
+    path = create_database(str(tmp_path / "export.db"), leads=250)
+    monkeypatch.setattr(main, "EXPORT_CHUNK_SIZE", 7)  # chunk borders fall inside runs of equal created_at
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(main, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    with TestClient(main.app) as client:
+        response = client.get("/api/leads/export", headers=AUTH)
+        compressed = client.get("/api/leads/export", params={"format": "csv", "gzip": "true"}, headers=AUTH)
+    assert response.status_code == 200
+    ids = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert ids == list(range(250, 0, -1))  # newest first, ties by id
+    assert compressed.headers["Content-Encoding"] == "gzip"  # httpx decodes the body
+    assert len(compressed.text.splitlines()) == 251  # header + rows
+
+
+def test_slow_export_does_not_hold_the_connection_pool(tmp_path, start_server):
+    """With the single pooled SQLite connection, other endpoints keep answering while a client
+    reads the export slowly"""
+    path = create_database(str(tmp_path / "pool.db"), leads=50000)
+    url = start_server(path, AUTO_MIGRATE="false", ADMIN_API_TOKEN=ADMIN_TOKEN, DB_POOL_TIMEOUT="5")
+    stop = threading.Event()
+    progress = {}
+
+    def read_slowly():
+        with httpx.stream("GET", f"{url}/api/leads/export", headers=AUTH, timeout=None) as response:
+            progress["status"] = response.status_code
+            for _ in response.iter_bytes(4096):
+                if stop.is_set():
+                    break
+                time.sleep(0.05)
+
+    reader = threading.Thread(target=read_slowly, daemon=True)
+    reader.start()
+    time.sleep(1.5)  # the export has filled the socket buffers and waits for the reader
+    try:
+        with httpx.Client(base_url=url, timeout=30.0) as client:
+            calls = [
+                lambda: client.get("/api/leads/1", headers=AUTH),
+                lambda: client.get("/api/leads", params={"limit": 10}, headers=AUTH),
+                lambda: client.get("/api/stats"),
+                lambda: client.post("/api/leads", json={
+                    "name": "Pool Check", "email": "pool@example.com", "phone": "+79990000000", "style": "pop",
+                }),
+            ]
+            for call in calls:
+                started = time.perf_counter()
+                response = call()
+                assert response.status_code == 200, response.request.url
+                assert time.perf_counter() - started < 2.0, response.request.url
+        assert progress["status"] == 200
+        assert reader.is_alive(), "export finished before the checks ran"
+    finally:
+        stop.set()
+        reader.join(timeout=10)
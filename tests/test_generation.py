@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+import main
+from generation import FakeGenerationBackend, GenerationError, TrackGenerator
+from track_storage import TrackStorage
+
+
+def make_generator(delay: float = 0.0, **kwargs) -> TrackGenerator:
+    return TrackGenerator(FakeGenerationBackend(delay=delay), poll_interval=0.01, **kwargs)
+
+
+class Track:
+    def __init__(self, track_id: int, prompt: str = "a song about the sea", style: str = "pop", duration: int = 5):
+        self.id = track_id
+        self.token = f"token-{track_id}"
+        self.prompt = prompt
+        self.style = style
+        self.duration = duration
+
+
+def test_identical_requests_share_one_generation():
+    generator = make_generator(delay=0.05)
+
+    async def run():
+        first, second = await asyncio.gather(
+            generator.generate("A song", "pop", 30),
+            generator.generate("  a   SONG ", "pop", 30),
+        )
+        third = await generator.generate("a song", "pop", 30)
+        return first, second, third
+
+    (first, first_cached), (second, second_cached), (third, third_cached) = asyncio.run(run())
+    assert generator.backend.submitted == 1
+    assert first == second == third
+    assert (first_cached, second_cached, third_cached) == (False, True, True)
+
+
+def test_different_requests_are_generated_separately():
+    generator = make_generator()
+
+    async def run():
+        await generator.generate("a song", "pop", 30)
+        await generator.generate("a song", "rock", 30)
+        await generator.generate("a song", "pop", 60)
+
+    asyncio.run(run())
+    assert generator.backend.submitted == 3
+
+
+def test_fake_backend_drops_finished_tasks():
+    generator = make_generator()
+
+    async def run():
+        result, _ = await generator.generate("a song", "pop", 5)
+        audio = b"".join([chunk async for chunk in generator.backend.fetch_audio(result)])
+        return result, audio
+
+    result, audio = asyncio.run(run())
+    assert generator.backend._tasks == {}
+    assert result.duration == 5
+    assert len(audio) > 5 * 15000  # about 16 KB per second at 128 kbps
+
+
+def test_timeout_raises_and_caches_nothing():
+    generator = make_generator(delay=10, timeout=0.05)
+
+    async def run():
+        with pytest.raises(GenerationError, match="timed out"):
+            await generator.generate("a song", "pop", 30)
+
+    asyncio.run(run())
+    assert generator._in_flight == {}
+    assert len(generator._cache) == 0
+
+
+def test_failed_generation_is_shared_with_waiters_and_not_cached():
+    generator = make_generator(delay=10, timeout=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            generator.generate("a song", "pop", 30),
+            generator.generate("a song", "pop", 30),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, GenerationError) for result in results)
+    assert generator.backend.submitted == 1
+    assert len(generator._cache) == 0
+
+
+def test_failed_store_forgets_the_cached_result(monkeypatch, tmp_path):
+    generator = make_generator()
+    monkeypatch.setattr(main, "track_generator", generator)
+    monkeypatch.setattr(main, "track_storage", TrackStorage(str(tmp_path)))
+    fetch_audio = generator.backend.fetch_audio
+
+    async def broken_download(result):
+        raise GenerationError("audio download failed")
+        yield b""
+
+    async def run():
+        monkeypatch.setattr(generator.backend, "fetch_audio", broken_download)
+        with pytest.raises(GenerationError):
+            await main.process_track_generation(Track(1))
+        assert len(generator._cache) == 0
+
+        monkeypatch.setattr(generator.backend, "fetch_audio", fetch_audio)
+        assert await main.process_track_generation(Track(2)) == "/tracks/token-2/audio.mp3"
+        assert await main.process_track_generation(Track(3)) == "/tracks/token-3/audio.mp3"
+
+    asyncio.run(run())
+    assert generator.backend.submitted == 2  # regenerated after the failure, then served from cache
+    assert (tmp_path / "3" / "audio.mp3").stat().st_size > 0
+    assert not (tmp_path / "1" / "audio.mp3").exists()
+
+
+def test_backend_interface_is_abstract():
+    from generation import GenerationBackend
+
+    with pytest.raises(TypeError):
+        GenerationBackend()
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from jobs import TrackJobQueue
+from main import Base, TrackRequest
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    path = tmp_path / "jobs.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine, tables=[TrackRequest.__table__])
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+async def add_job(session_factory, **values) -> int:
+    async with session_factory() as db:
+        job = TrackRequest(prompt="a song", style="pop", duration=5, **values)
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+async def get_job(session_factory, job_id: int) -> TrackRequest:
+    async with session_factory() as db:
+        return await db.get(TrackRequest, job_id)
+
+
+def make_queue(session_factory, handler=None, events=None, **kwargs) -> TrackJobQueue:
+    async def done(job):
+        return f"/tracks/{job.id}/audio.mp3"
+
+    return TrackJobQueue(
+        session_factory, TrackRequest, handler or done, max_attempts=3, poll_interval=0.01,
+        on_status=(lambda job_id, status, url: events.append((job_id, status))) if events is not None else None,
+        **kwargs,
+    )
+
+
+def expired_lease(attempts: int) -> dict:
+    return dict(status="processing", attempts=attempts, locked_by="dead-worker",
+                locked_until=datetime.utcnow() - timedelta(seconds=1))
+
+
+def test_claim_takes_due_and_abandoned_jobs(session_factory):
+    async def run():
+        pending = await add_job(session_factory)
+        later = await add_job(session_factory, run_after=datetime.utcnow() + timedelta(hours=1))
+        abandoned = await add_job(session_factory, **expired_lease(attempts=1))
+        claimed = await make_queue(session_factory).claim(10)
+        return pending, later, abandoned, claimed, await get_job(session_factory, abandoned)
+
+    pending, later, abandoned, claimed, job = asyncio.run(run())
+    assert claimed == [pending, abandoned]
+    assert job.attempts == 2 and job.locked_by != "dead-worker"
+
+
+def test_job_abandoned_on_its_last_attempt_fails(session_factory):
+    events = []
+
+    async def run():
+        poison = await add_job(session_factory, **expired_lease(attempts=3))
+        claimed = await make_queue(session_factory, events=events).claim(10)
+        return poison, claimed, await get_job(session_factory, poison)
+
+    poison, claimed, job = asyncio.run(run())
+    assert claimed == []
+    assert job.status == "failed" and job.attempts == 3 and job.locked_by is None
+    assert "lease expired" in job.last_error
+    assert events == [(poison, "failed")]
+
+
+def test_recover_stuck_requeues_or_fails(session_factory):
+    async def run():
+        retry = await add_job(session_factory, **expired_lease(attempts=1))
+        poison = await add_job(session_factory, **expired_lease(attempts=3))
+        running = await add_job(session_factory, status="processing", attempts=3, locked_by="alive",
+                                 locked_until=datetime.utcnow() + timedelta(minutes=1))
+        recovered = await make_queue(session_factory).recover_stuck()
+        jobs = [await get_job(session_factory, job_id) for job_id in (retry, poison, running)]
+        return recovered, [job.status for job in jobs]
+
+    recovered, statuses = asyncio.run(run())
+    assert recovered == 1
+    assert statuses == ["pending", "failed", "processing"]
+
+
+def test_failures_are_retried_until_max_attempts(session_factory):
+    async def broken(job):
+        raise RuntimeError("provider down")
+
+    async def run():
+        job_id = await add_job(session_factory)
+        queue = make_queue(session_factory, handler=broken, retry_delay=0)
+        queue.start()
+        for _ in range(200):
+            job = await get_job(session_factory, job_id)
+            if job.status == "failed":
+                break
+            await asyncio.sleep(0.02)
+        await queue.stop()
+        return await get_job(session_factory, job_id)
+
+    job = asyncio.run(run())
+    assert job.status == "failed" and job.attempts == 3
+    assert job.last_error == "provider down"
+
+
+def test_stop_waits_for_cancelled_jobs(session_factory):
+    finished = []
+
+    async def run():
+        running = asyncio.Event()
+
+        async def hang(job):
+            running.set()
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                await asyncio.sleep(0.01)  # cleanup that needs the loop
+                finished.append(job.id)
+            return ""
+
+        job_id = await add_job(session_factory)
+        queue = make_queue(session_factory, handler=hang)
+        queue.start()
+        await asyncio.wait_for(running.wait(), 5)
+        await queue.stop(timeout=0.05)
+        assert finished == [job_id]
+        return await get_job(session_factory, job_id)
+
+    job = asyncio.run(run())
+    assert job.status == "processing"  # keeps its lease, picked up again once it expires
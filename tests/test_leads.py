@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from contacts import normalize_phone
+
+_numbers = itertools.count(1)
+
+
+def lead(name: str = "Anna", phone: str = None, email: str = None, **values) -> dict:
+    """Lead form values with contacts no other test uses"""
+    n = next(_numbers)
+    return {"name": name, "email": email or f"lead-test-{n}@example.com",
+            "phone": phone if phone is not None else f"+7 (900) 100-{n // 100:02d}-{n % 100:02d}",
+            "style": "pop", **values}
+
+
+@pytest.fixture
+def client(database, monkeypatch):
+    monkeypatch.setattr(main, "LEAD_BATCH_DELAY", 0.3)  # concurrent submissions share one batch
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_new_lead_is_created(client):
+    response = client.post("/api/leads", json=lead(message="Хочу песню"))
+    assert response.status_code == 200
+    assert "X-Duplicate-Of" not in response.headers
+    body = response.json()
+    assert body["id"] > 0 and body["message"] == "Хочу песню"
+
+
+def test_idempotency_key_replay_returns_only_the_id(client):
+    values = lead()
+    first = client.post("/api/leads", json=values, headers={"Idempotency-Key": "replay-1"}).json()
+    # Even with different contacts the key wins: it is the same submission retried
+    replay = client.post("/api/leads", json=lead(), headers={"Idempotency-Key": "replay-1"})
+    assert replay.status_code == 200
+    assert replay.headers["X-Duplicate-Of"] == str(first["id"])
+    assert replay.json() == {"id": first["id"], "duplicate": True}
+
+
+@pytest.mark.parametrize("field", ["email", "phone"])
+def test_same_contact_within_the_window_is_a_duplicate(client, field):
+    values = lead()
+    first = client.post("/api/leads", json=values).json()
+    repeat = lead(name="Someone else")
+    if field == "email":
+        repeat["email"] = values["email"].upper()
+    else:
+        digits = normalize_phone(values["phone"])
+        repeat["phone"] = "8" + digits[1:]  # same number written the other way
+    response = client.post("/api/leads", json=repeat)
+    assert response.headers["X-Duplicate-Of"] == str(first["id"])
+    assert response.json() == {"id": first["id"], "duplicate": True}  # nothing of the stored lead leaks
+
+
+def test_duplicate_window_zero_disables_detection(client, monkeypatch):
+    monkeypatch.setattr(main, "LEAD_DUPLICATE_WINDOW", 0)
+    values = lead()
+    first = client.post("/api/leads", json=values).json()
+    second = client.post("/api/leads", json=values)
+    assert "X-Duplicate-Of" not in second.headers and second.json()["id"] != first["id"]
+
+
+def test_phone_less_leads_in_one_batch_are_not_merged(client):
+    anna = lead("Anna", phone="-")
+    first = client.post("/api/leads", json=anna).json()
+
+    batch = [dict(anna), lead("Carl", phone="-"), lead("Dora", phone="")]
+    with ThreadPoolExecutor(len(batch)) as pool:
+        anna_again, carl, dora = pool.map(lambda values: client.post("/api/leads", json=values), batch)
+
+    assert anna_again.json() == {"id": first["id"], "duplicate": True}
+    for response, values in ((carl, batch[1]), (dora, batch[2])):
+        assert "X-Duplicate-Of" not in response.headers
+        assert response.json()["email"] == values["email"]
+
+
+def test_find_recent_leads_ignores_empty_phone_keys(database):
+    stored = lead("Stored", phone="-")
+
+    async def run():
+        async with main.AsyncSessionLocal() as db:
+            db.add(main.Lead(**stored,
+                             email_normalized=stored["email"], phone_normalized=""))
+            await db.commit()
+            rows = [
+                {"email_normalized": stored["email"], "phone_normalized": ""},
+                {"email_normalized": "nobody@example.com", "phone_normalized": ""},
+            ]
+            return await main.find_recent_leads(db, rows)
+
+    found, missing = asyncio.run(run())
+    assert found is not None and found.name == "Stored"
+    assert missing is None
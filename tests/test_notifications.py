@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import notifications
+from notifications import TELEGRAM_MESSAGE_LIMIT, TelegramDispatcher, build_messages
+
+
+class FakeTelegram:
+    """sendMessage endpoint answering from a script of responses, then 200"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.texts = []
+        self.times = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/bottoken/sendMessage"
+        body = json.loads(request.content)
+        assert body["parse_mode"] == "HTML"
+        self.texts.append(body["text"])
+        self.times.append(time.monotonic())
+        answer = self.script.pop(0) if self.script else 200
+        if callable(answer):
+            answer = answer(body["text"])
+        if isinstance(answer, Exception):
+            raise answer
+        if answer == 429:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.01}})
+        return httpx.Response(answer, json={"ok": answer == 200})
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(notifications, "backoff_delay", lambda attempt: 0)
+
+
+def dispatch(telegram: FakeTelegram, items, min_interval: float = 0.0, max_retries: int = 5):
+    """Queue `items` before the worker starts, flush them and return (delivered ids, send outcomes)"""
+    delivered, outcomes = [], []
+
+    async def on_delivered(ids):
+        delivered.extend(ids)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(telegram)) as client:
+            dispatcher = TelegramDispatcher(
+                client, "https://telegram.test/bottoken", "42", min_interval=min_interval,
+                max_retries=max_retries, on_delivered=on_delivered,
+                on_send=lambda duration, outcome: outcomes.append(outcome),
+            )
+            for item_id, text in items:
+                dispatcher.enqueue(item_id, text)
+            dispatcher.start()
+            await dispatcher.stop()
+
+    asyncio.run(run())
+    return delivered, outcomes
+
+
+def test_burst_is_coalesced_into_one_digest():
+    telegram = FakeTelegram()
+    delivered, outcomes = dispatch(telegram, [(i, f"lead {i}") for i in range(1, 6)])
+    assert delivered == [1, 2, 3, 4, 5]
+    assert len(telegram.texts) == 1
+    assert "Новых заявок: 5" in telegram.texts[0] and "lead 5" in telegram.texts[0]
+    assert outcomes == ["ok"]
+
+
+def test_messages_to_one_chat_respect_min_interval():
+    telegram = FakeTelegram(500)
+    dispatch(telegram, [(1, "lead 1")], min_interval=0.1)
+    assert len(telegram.times) == 2
+    assert telegram.times[1] - telegram.times[0] >= 0.09
+
+
+def test_rate_limit_is_retried_after_retry_after():
+    telegram = FakeTelegram(429, 429)
+    delivered, outcomes = dispatch(telegram, [(1, "lead 1")])
+    assert delivered == [1]
+    assert outcomes == ["rate_limited", "rate_limited", "ok"]
+
+
+def test_server_and_network_errors_are_retried():
+    telegram = FakeTelegram(502, httpx.ConnectError("connection refused"), 503)
+    delivered, outcomes = dispatch(telegram, [(1, "lead 1")])
+    assert delivered == [1]
+    assert outcomes == ["server_error", "network_error", "server_error", "ok"]
+
+
+def test_gives_up_after_max_retries():
+    telegram = FakeTelegram(*[500] * 10)
+    delivered, outcomes = dispatch(telegram, [(1, "lead 1")], max_retries=2)
+    assert delivered == []
+    assert outcomes == ["server_error"] * 3
+
+
+def test_rejected_digest_is_resent_item_by_item():
+    telegram = FakeTelegram(*[lambda text: 400 if "broken" in text else 200] * 10)
+    delivered, outcomes = dispatch(telegram, [(1, "lead 1"), (2, "broken lead"), (3, "lead 3")])
+    assert delivered == [1, 3]
+    assert telegram.texts[1:] == ["lead 1", "broken lead", "lead 3"]
+    assert outcomes == ["rejected", "ok", "rejected", "ok"]
+
+
+def test_rejected_single_message_is_not_retried():
+    telegram = FakeTelegram(400)
+    delivered, outcomes = dispatch(telegram, [(1, "lead 1")])
+    assert delivered == [] and outcomes == ["rejected"]
+
+
+def test_digests_fit_the_message_limit():
+    batch = [(i, "x" * 1000) for i in range(10)]
+    messages = build_messages(batch)
+    assert [item for ids, _ in messages for item in ids] == list(range(10))
+    assert all(len(text) <= TELEGRAM_MESSAGE_LIMIT for _, text in messages)
+    assert [len(ids) for ids, _ in messages] == [3, 3, 3, 1]
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import rate_limit
+from rate_limit import Limit, MemoryRateLimitStore, RateLimitRule, RedisRateLimitStore, client_subnet, parse_rules, take_token
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_rules():
+    rules = parse_rules("POST /api/leads: 5/minute ip, 30/minute subnet; POST /api/generate*: 3/10min IP;")
+    assert rules == [
+        RateLimitRule("POST", "/api/leads", (Limit(5 / 60, 5.0, "ip"), Limit(30 / 60, 30.0, "subnet"))),
+        RateLimitRule("POST", "/api/generate*", (Limit(3 / 600, 3.0, "ip"),)),
+    ]
+    assert rules[1].matches("POST", "/api/generate/batch")
+    assert not rules[0].matches("GET", "/api/leads")
+    assert not rules[0].matches("POST", "/api/leads/export")
+
+
+@pytest.mark.parametrize("spec", ["POST: 5/minute ip", "POST /api/leads: 5/fortnight ip", "POST /api/leads: five/minute ip",
+                                  "POST /api/leads: 5/minute user"])
+def test_parse_rules_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_rules(spec)
+
+
+def test_take_token_refills_up_to_capacity():
+    tokens, allowed, retry_after = take_token(None, None, now=0, rate=1, capacity=2)
+    assert (tokens, allowed, retry_after) == (1, True, 0)
+    tokens, allowed, _ = take_token(tokens, 0, now=0, rate=1, capacity=2)
+    assert (tokens, allowed) == (0, True)
+    tokens, allowed, retry_after = take_token(tokens, 0, now=0.25, rate=1, capacity=2)
+    assert not allowed and retry_after == pytest.approx(0.75)
+    tokens, allowed, _ = take_token(0, 0, now=100, rate=1, capacity=2)
+    assert allowed and tokens == 1  # refilled to capacity, not beyond
+
+
+def test_memory_store_denies_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    store = MemoryRateLimitStore(max_keys=2)
+
+    async def run():
+        results = [await store.take("a", rate=0.5, capacity=2) for _ in range(3)]
+        clock.now += 2
+        results.append(await store.take("a", rate=0.5, capacity=2))
+        await store.take("b", rate=1, capacity=1)
+        await store.take("c", rate=1, capacity=1)
+        return results
+
+    results = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, False, True]
+    assert results[2][1] == pytest.approx(2.0)
+    assert list(store._buckets) == ["b", "c"]  # least recently used bucket evicted
+
+
+def test_redis_store_runs_the_lua_bucket(monkeypatch):
+    """TOKEN_BUCKET_SCRIPT executed by a Redis emulator with a real Lua interpreter"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(rate_limit.redis, "from_url", lambda url, **kwargs: fakeredis.aioredis.FakeRedis(server=server))
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+
+    async def run():
+        store = RedisRateLimitStore("redis://fake")
+        other_worker = RedisRateLimitStore("redis://fake")
+        results = [await store.take("k", rate=0.5, capacity=2), await other_worker.take("k", rate=0.5, capacity=2),
+                   await store.take("k", rate=0.5, capacity=2)]
+        clock.now += 1
+        results.append(await other_worker.take("k", rate=0.5, capacity=2))
+        clock.now += 1
+        results.append(await store.take("k", rate=0.5, capacity=2))
+        ttl = await store.client.pttl("rl:k")
+        await store.aclose()
+        await other_worker.aclose()
+        return results, ttl
+
+    results, ttl = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, False, False, True]
+    assert results[2][1] == pytest.approx(2.0) and results[3][1] == pytest.approx(1.0)
+    assert 0 < ttl <= 5000  # refill time plus a second
+
+
+def test_lua_bucket_matches_take_token(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(rate_limit.redis, "from_url", lambda url, **kwargs: fakeredis.aioredis.FakeRedis())
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    steps = [0, 0.1, 0.1, 3, 0, 0, 0.7, 10, 0]
+
+    async def run():
+        store = RedisRateLimitStore("redis://fake")
+        tokens = updated_at = None
+        for step in steps:
+            clock.now += step
+            expected_tokens, expected, expected_wait = take_token(tokens, updated_at, clock.now, 1.5, 3)
+            tokens, updated_at = expected_tokens, clock.now
+            allowed, wait = await store.take("k", rate=1.5, capacity=3)
+            assert (allowed, wait) == (expected, pytest.approx(expected_wait))
+        await store.aclose()
+
+    asyncio.run(run())
+
+
+def test_client_subnet():
+    assert client_subnet("203.0.113.77") == "203.0.113.0/24"
+    assert client_subnet("2001:db8::1") == "2001:db8::/64"
+    assert client_subnet("testclient") == "testclient"
+
+
+def test_store_failure_lets_requests_through():
+    class BrokenStore:
+        async def take(self, *args):
+            raise ConnectionError("redis is down")
+
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+
+    middleware = rate_limit.RateLimitMiddleware(app, BrokenStore(), parse_rules("POST /x: 1/hour ip"))
+    scope = {"type": "http", "method": "POST", "path": "/x", "client": ("203.0.113.1", 1)}
+    asyncio.run(middleware(scope, None, None))
+    assert calls == ["/x"]
+
+
+def test_rejected_request_carries_cors_headers():
+    client = TestClient(main.app)
+    headers = {"Origin": "https://landing.example"}
+    assert client.post("/rate-limit-probe", headers=headers).status_code != 429
+    rejected = client.post("/rate-limit-probe", headers=headers)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) > 0
+    assert rejected.headers["Access-Control-Allow-Origin"] in ("*", "https://landing.example")
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+SCRIPT = """
+import uvicorn
+import serve
+
+uvicorn.run = lambda *args, **kwargs: None  # the app itself is not needed here
+serve.main()
+
+import main
+assert not main.AUTO_MIGRATE, "in-process worker would migrate again"
+assert main.METRICS_MULTIPROC_DIR == serve.METRICS_MULTIPROC_DIR
+"""
+
+
+def test_single_worker_does_not_migrate_twice(tmp_path):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'serve.db'}",
+        "METRICS_MULTIPROC_DIR": str(tmp_path / "metrics"),
+        "WEB_CONCURRENCY": "1",
+    }
+    env.pop("AUTO_MIGRATE", None)
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "serve.db").exists()
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from session_store import MemorySessionStore, SessionStore, hash_token
+
+
+def test_the_interface_cannot_be_instantiated_or_half_implemented():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class WithoutSweep(SessionStore):
+        async def create(self):
+            return "token"
+
+        async def get(self, token):
+            return None
+
+        async def delete(self, token):
+            pass
+
+    with pytest.raises(TypeError):
+        WithoutSweep()
+
+
+def test_memory_store_expires_and_sweeps_sessions():
+    async def run():
+        store = MemorySessionStore(ttl=0.05)
+        kept, expired = await store.create(), await store.create()
+        assert await store.get(kept) is not None
+        assert hash_token(kept) in store._sessions  # stored by hash, not the token
+        await store.delete(kept)
+        assert await store.get(kept) is None
+        await asyncio.sleep(0.1)
+        assert await store.sweep() == 1
+        assert await store.get(expired) is None and len(store) == 0
+
+    asyncio.run(run())
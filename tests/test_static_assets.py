@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import os
+import threading
+
+import pytest
+
+import static_assets
+from static_assets import ON_REQUEST_COMPRESSION, PRELOAD_COMPRESSION, StaticAssetCache
+
+CSS = b"body { color: #333; margin: 0 auto; }\n" * 100
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "style.css").write_bytes(CSS)
+    (tmp_path / "index.html").write_text('<link rel="stylesheet" href="/static/style.css">' + " " * 600)
+    return tmp_path
+
+
+def compressed_with(asset, compression) -> bool:
+    gzip_level, brotli_quality = compression
+    if asset.gzip_body != gzip.compress(asset.body, compresslevel=gzip_level, mtime=0):
+        return False
+    if static_assets.brotli is not None:
+        return asset.br_body == static_assets.brotli.compress(asset.body, quality=brotli_quality)
+    return True
+
+
+def test_preload_compresses_every_file_at_full_strength(root):
+    cache = StaticAssetCache(str(root))
+    assert cache.preload() == 2
+    assert compressed_with(cache.get("style.css"), PRELOAD_COMPRESSION)
+    index = cache.get("index.html")
+    assert compressed_with(index, PRELOAD_COMPRESSION)
+    assert f"/static/style.css?v={cache.get('style.css').digest}".encode() in index.body
+
+
+def test_files_loaded_on_a_request_are_read_off_the_event_loop_at_cheaper_settings(root, monkeypatch):
+    cache = StaticAssetCache(str(root))
+    cache.preload()
+    (root / "extra.js").write_bytes(b"console.log('late asset');\n" * 50)
+    load = cache._load
+    threads = []
+
+    def recording_load(*args):
+        threads.append(threading.current_thread())
+        return load(*args)
+
+    monkeypatch.setattr(cache, "_load", recording_load)
+
+    async def run():
+        return await cache.aget("extra.js"), threading.current_thread()
+
+    asset, loop_thread = asyncio.run(run())
+    assert asset.body.startswith(b"console.log")
+    assert threads and all(thread is not loop_thread for thread in threads)
+    assert compressed_with(asset, ON_REQUEST_COMPRESSION)
+
+
+def test_fresh_assets_are_answered_without_the_threadpool(root, monkeypatch):
+    cache = StaticAssetCache(str(root), check_interval=60)
+    cache.preload()
+
+    async def no_threads(*args):
+        raise AssertionError("went to the threadpool")
+
+    monkeypatch.setattr(static_assets, "run_in_threadpool", no_threads)
+    assert asyncio.run(cache.aget("style.css")).body == CSS
+
+
+def test_changed_files_are_reloaded_after_the_check_interval(root):
+    cache = StaticAssetCache(str(root), check_interval=0)
+    cache.preload()
+    old_digest = asyncio.run(cache.aget("style.css")).digest
+    (root / "style.css").write_bytes(CSS + b"a { color: red; }\n")
+    os.utime(root / "style.css", ns=(1, 1))  # a new mtime even on coarse clocks
+    asset = asyncio.run(cache.aget("style.css"))
+    assert asset.digest != old_digest
+    assert compressed_with(asset, ON_REQUEST_COMPRESSION)
+    # The page links to the new version
+    assert f"?v={asset.digest}".encode() in asyncio.run(cache.aget("index.html")).body
+    assert asyncio.run(cache.aget("../conftest.py")) is None
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from track_storage import TrackStorage, parse_range
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def make_client(storage: TrackStorage) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/tracks/{track_id}")
+    async def track(request: Request, track_id: int):
+        return storage.response(request, track_id)
+
+    return TestClient(app)
+
+
+def test_save_writes_atomically_and_serves_ranges(tmp_path):
+    storage = TrackStorage(str(tmp_path))
+    assert asyncio.run(storage.save(1, chunks(b"0123", b"456789"))) == 10
+    assert not os.path.exists(storage.path_for(1) + ".part")
+
+    client = make_client(storage)
+    whole = client.get("/tracks/1")
+    assert whole.status_code == 200 and whole.content == b"0123456789"
+    part = client.get("/tracks/1", headers={"Range": "bytes=2-5"})
+    assert part.status_code == 206 and part.content == b"2345"
+    assert part.headers["Content-Range"] == "bytes 2-5/10"
+    assert client.get("/tracks/1", headers={"If-None-Match": whole.headers["ETag"]}).status_code == 304
+    assert client.get("/tracks/1", headers={"Range": "bytes=20-"}).status_code == 416
+    assert all(handle.users == 0 for handle in storage._open.values())
+
+
+def test_failed_save_removes_the_partial_file(tmp_path):
+    storage = TrackStorage(str(tmp_path))
+
+    async def broken():
+        yield b"first chunk"
+        raise ConnectionError("download interrupted")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(storage.save(1, broken()))
+    assert os.listdir(os.path.dirname(storage.path_for(1))) == []
+    assert not storage.exists(1)
+
+
+def test_unsent_response_holds_no_descriptor(tmp_path):
+    storage = TrackStorage(str(tmp_path), max_open_files=1)
+    asyncio.run(storage.save(1, chunks(b"a" * 100)))
+    asyncio.run(storage.save(2, chunks(b"b" * 100)))
+
+    class FakeRequest:
+        method = "GET"
+        headers = {}
+
+    response = storage.response(FakeRequest(), 1)  # body never iterated: the client went away
+    assert response.status_code == 200
+    handle = storage._open[1]
+    assert handle.users == 0
+
+    assert storage._acquire(2) is not None  # evicts track 1
+    with pytest.raises(OSError):
+        os.fstat(handle.fd)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-", 10) == (0, 9)
+    assert parse_range("bytes=-3", 10) == (7, 9)
+    assert parse_range("bytes=5-100", 10) == (5, 9)
+    assert parse_range("bytes=10-", 10) == "invalid"
+    assert parse_range("bytes=0-1,3-4", 10) is None
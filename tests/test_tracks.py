@@ -0,0 +1,103 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+import main
+from conftest import ADMIN_TOKEN, create_database
+from track_storage import TrackStorage
+
+ADMIN = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+@pytest.fixture
+def client(database):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def generate(client) -> dict:
+    response = client.post("/api/generate", json={"prompt": "a song about the sea", "style": "pop"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def track_id(token: str) -> int:
+    with main.engine.connect() as conn:
+        return conn.execute(main.select(main.TrackRequest.id).where(main.TrackRequest.token == token)).scalar_one()
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/api/pool"])
+def test_monitoring_endpoints_require_admin(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers=ADMIN).status_code == 200
+
+
+def test_tracks_are_addressed_by_a_random_token(client):
+    first, second = generate(client), generate(client)
+    assert "id" not in first
+    assert len(first["token"]) >= 20 and first["token"] != second["token"]
+
+    response = client.get(f"/api/tracks/{first['token']}")
+    assert response.status_code == 200
+    assert response.json()["prompt"] == "a song about the sea"
+    # The sequential id no longer finds anything
+    assert client.get(f"/api/tracks/{track_id(first['token'])}").status_code == 404
+    assert client.get("/api/tracks/1").status_code == 404
+
+
+def test_status_events_are_keyed_by_token(client):
+    token = generate(client)["token"]
+    with main.engine.begin() as conn:
+        conn.execute(main.update(main.TrackRequest).where(main.TrackRequest.token == token).values(
+            status="completed", audio_url=main.track_audio_url(token)
+        ))
+    response = client.get(f"/api/tracks/{token}/events")
+    assert response.status_code == 200
+    event = json.loads(response.text.split("data: ", 1)[1].split("\n", 1)[0])
+    assert event == {"token": token, "status": "completed", "audio_url": f"/tracks/{token}/audio.mp3"}
+    assert client.get(f"/api/tracks/{track_id(token)}/events").status_code == 404
+
+
+def test_audio_is_served_by_token_only(client, tmp_path, monkeypatch):
+    storage = TrackStorage(str(tmp_path))
+    monkeypatch.setattr(main, "track_storage", storage)
+    token = generate(client)["token"]
+    internal_id = track_id(token)
+    asyncio.run(storage.save(internal_id, chunks(b"ID3", b"audio")))
+
+    response = client.get(f"/tracks/{token}/audio.mp3")
+    assert response.status_code == 200 and response.content == b"ID3audio"
+    assert client.get(f"/tracks/{internal_id}/audio.mp3").status_code == 404
+    assert client.get("/tracks/unknown/audio.mp3").status_code == 404
+
+
+def test_migration_gives_existing_tracks_tokens_and_moves_their_audio_urls(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    create_database(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO track_requests (prompt, style, status, audio_url, token) VALUES (?, 'pop', ?, ?, NULL)",
+            [("done", "completed", "/tracks/1/audio.mp3"), ("queued", "pending", None)],
+        )
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        main.run_migrations(engine)
+        main.run_migrations(engine)  # idempotent: tokens are not replaced again
+    finally:
+        engine.dispose()
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT token, audio_url FROM track_requests ORDER BY id").fetchall()
+    (done_token, done_url), (queued_token, queued_url) = rows
+    assert done_token and queued_token and done_token != queued_token
+    assert done_url == f"/tracks/{done_token}/audio.mp3"
+    assert queued_url is None
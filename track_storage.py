@@ -0,0 +1,208 @@
+"""
+Generated track storage and HTTP range serving
+Audio files live on disk under TRACKS_DIR and are streamed with pread() from a bounded
+LRU of open file descriptors, so seeking clients never make the worker buffer a whole file
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class OpenTrack:
+    """Shared read-only descriptor; closed once evicted and no longer in use"""
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDONLY)
+        stat = os.fstat(self.fd)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.inode = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        self.etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.users = 0
+        self.evicted = False
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TrackStorage:
+    def __init__(self, root: str, max_open_files: int = 64, chunk_size: int = 256 * 1024):
+        self.root = root
+        self.max_open_files = max_open_files
+        self.chunk_size = chunk_size
+        self._open: "OrderedDict[int, OpenTrack]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, track_id: int) -> str:
+        return os.path.join(self.root, str(track_id), "audio.mp3")
+
+    def exists(self, track_id: int) -> bool:
+        return os.path.isfile(self.path_for(track_id))
+
+    async def save(self, track_id: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write a track atomically (temp file + rename) and return its size"""
+        path = self.path_for(track_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        size = 0
+        try:
+            with open(tmp_path, "wb") as file:
+                async for chunk in chunks:
+                    await run_in_threadpool(file.write, chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # A failed or cancelled download must not leave a partial file behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._forget(track_id)
+        return size
+
+    def _acquire(self, track_id: int) -> Optional[OpenTrack]:
+        path = self.path_for(track_id)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            handle = self._open.get(track_id)
+            if handle is not None and handle.inode != (stat.st_dev, stat.st_ino, stat.st_mtime_ns):
+                self._evict(track_id)  # replaced on disk
+                handle = None
+            if handle is None:
+                try:
+                    handle = OpenTrack(path)
+                except OSError:
+                    return None
+                self._open[track_id] = handle
+                while len(self._open) > self.max_open_files:
+                    self._evict(next(iter(self._open)))
+            else:
+                self._open.move_to_end(track_id)
+            handle.users += 1
+            return handle
+
+    def _release(self, handle: OpenTrack):
+        with self._lock:
+            handle.users -= 1
+            if handle.evicted and handle.users == 0:
+                handle.close()
+
+    def _evict(self, track_id: int):
+        handle = self._open.pop(track_id)
+        handle.evicted = True
+        if handle.users == 0:
+            handle.close()
+
+    def _forget(self, track_id: int):
+        with self._lock:
+            if track_id in self._open:
+                self._evict(track_id)
+
+    def close(self):
+        with self._lock:
+            for track_id in list(self._open):
+                self._evict(track_id)
+
+    async def _stream(self, track_id: int, inode: tuple, start: int, length: int):
+        """Body of a track response.
+
+        The descriptor is taken when the body starts streaming, so a response
+        that is never sent (client gone before the first chunk) holds nothing.
+        """
+        handle = self._acquire(track_id)
+        if handle is None:
+            return
+        try:
+            if handle.inode != inode:
+                logger.warning(f"Track {track_id} was replaced while its response was being sent")
+                return
+            offset, remaining = start, length
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, handle.fd, min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            self._release(handle)
+
+    def response(self, request: Request, track_id: int) -> Optional[Response]:
+        """200/206/304/416 response for the track, None if it isn't stored"""
+        handle = self._acquire(track_id)
+        if handle is None:
+            return None
+        self._release(handle)  # only the metadata is needed here; _stream acquires it again
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": handle.etag,
+            "Last-Modified": formatdate(handle.mtime, usegmt=True),
+            "Cache-Control": "public, max-age=86400",
+        }
+        if request.headers.get("if-none-match") == handle.etag:
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range == handle.etag):
+            byte_range = parse_range(range_header, handle.size)
+            if byte_range == "invalid":
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{handle.size}"})
+
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{handle.size}"
+        else:
+            start, end = 0, handle.size - 1
+            status_code = 200
+        length = end - start + 1
+        headers["Content-Length"] = str(length)
+
+        if request.method == "HEAD":
+            return Response(status_code=status_code, headers=headers, media_type="audio/mpeg")
+        return StreamingResponse(
+            self._stream(track_id, handle.inode, start, length),
+            status_code=status_code,
+            headers=headers,
+            media_type="audio/mpeg",
+        )
+
+
+def parse_range(header: str, size: int):
+    """(start, end) for a single `bytes=` range, None to ignore it, "invalid" for 416"""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None  # multi-range or unknown unit: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            return "invalid"
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "invalid"
+    return start, end
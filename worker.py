@@ -0,0 +1,42 @@
+"""
+Standalone track generation worker
+Runs the durable job queue outside the web process (TRACK_WORKER_MODE=external)
+
+Usage:
+    python worker.py
+"""
+import asyncio
+import logging
+import signal
+
+from main import (
+    create_track_queue, track_generator, track_storage, async_engine, engine, run_migrations,
+    AUTO_MIGRATE, TRACK_WORKER_CONCURRENCY,
+)
+
+logger = logging.getLogger("worker")
+
+
+async def run():
+    if AUTO_MIGRATE:
+        run_migrations(engine)
+    queue = create_track_queue()
+    await queue.recover_stuck()
+    queue.start()
+    logger.info(f"Track worker {queue.worker_id} started (concurrency {TRACK_WORKER_CONCURRENCY})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Stopping track worker, waiting for running jobs...")
+    await queue.stop()
+    await track_generator.aclose()
+    track_storage.close()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())